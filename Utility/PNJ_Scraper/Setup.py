@@ -3,8 +3,12 @@ from setuptools import setup
 setup(
     install_requires=[
         "requests",
-        "aiohttp",
+        "aiohttp[speedups]",
         "bs4",
         "zns_logging",
-    ]
+    ],
+    extras_require={
+        "lxml": ["lxml"],
+        "postgres": ["asyncpg"],
+    },
 )
@@ -0,0 +1,210 @@
+"""End-to-end crawl benchmark against the local FakePNJServer.
+
+Starts the fake server in its own process, runs PNJScraper against it from a
+scratch directory and prints a JSON report (also written with --output) so
+runs can be compared:
+
+    python benchmark/CrawlBenchmark.py --pages 20 --latency-ms 30 --error-rate 0.01 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "src"))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from FakePNJServer import serve  # noqa: E402
+from PNJScraper import PNJScraper  # noqa: E402
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Fake server did not start on {host}:{port}")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of the scraper and of its largest finished pool worker, in MB.
+
+    RUSAGE_CHILDREN only covers children that were waited for, so this must
+    run after the scraper has shut its pools down but before the fake server
+    process is joined; the server reports its own figure in /_stats.
+    """
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    return {
+        "scraper": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "pool_workers": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1),
+    }
+
+
+def instrument(scraper: PNJScraper, latencies: List[float], sql_seconds: List[float], writers: List):
+    """Wrap fetch and the SQL writer of one scraper instance with timers, collecting the writers in writers"""
+    fetch = scraper.fetch
+
+    async def timed_fetch(url: str, return_bytes: bool = False, request_class: str = "page"):
+        started = time.perf_counter()
+        try:
+            return await fetch(url, return_bytes, request_class)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    create_sql_writer = scraper.create_sql_writer
+
+    def timed_create_sql_writer():
+        writer = create_sql_writer()
+        writers.append(writer)
+        for name in ("add", "flush", "close"):
+            method = getattr(writer, name)
+
+            def timed(*args, _method=method, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    sql_seconds.append(time.perf_counter() - started)
+
+            setattr(writer, name, timed)
+        return writer
+
+    scraper.fetch = timed_fetch
+    scraper.create_sql_writer = timed_create_sql_writer
+
+
+async def run_crawl(args, base_url: str) -> Dict:
+    latencies: List[float] = []
+    sql_seconds: List[float] = []
+    writers: List = []
+    scraper = PNJScraper(
+        "benchmark",
+        base_url=base_url,
+        max_concurrent_requests=args.concurrency,
+        process_workers=args.process_workers,
+        extractor_backend=args.extractor,
+        output_format=args.output_format,
+        use_cache=False,
+        use_state=False,
+        download_images=args.images,
+        use_data_route=args.data_route,
+    )
+    scraper.logger.setLevel(args.log_level)
+    instrument(scraper, latencies, sql_seconds, writers)
+
+    started = time.perf_counter()
+    async with scraper:
+        await scraper.run(1, args.pages)
+    elapsed = time.perf_counter() - started
+    rss = peak_rss_mb()
+
+    sql_dir = os.path.join("data", "benchmark", "sql")
+    sql_bytes = sum(os.path.getsize(os.path.join(sql_dir, name)) for name in os.listdir(sql_dir))
+    # Measured, not derived from the config: only product rows the run actually wrote count
+    products = sum(writer.row_counts["products"] for writer in writers)
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_per_sec": round(args.pages / elapsed, 2),
+        "products": products,
+        "products_per_sec": round(products / elapsed, 2),
+        "fetches": len(latencies),
+        "fetch_latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+        },
+        "sql_generation_seconds": round(sum(sql_seconds), 4),
+        "sql_bytes": sql_bytes,
+        "dropped_urls": len(scraper.dropped_urls) + len(scraper.image_downloader.failed_urls),
+        "limiter": scraper.limiter.get_stats(),
+        "http_pool": scraper.http.get_stats(),
+        "images": scraper.image_downloader.get_stats() if args.images else None,
+        "data_route": scraper.get_data_route_stats(),
+        "bytes_fetched": scraper.metrics.get_stats()["stages"].get("fetch", {}).get("bytes", 0),
+        "peak_rss_mb": rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PNJScraper against a local fake pnj.com.vn")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-bytes", type=int, default=100_000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--process-workers", type=int, default=0)
+    parser.add_argument("--extractor", default="scan", choices=["scan", "lxml", "bs4"])
+    parser.add_argument("--output-format", default="do-block", choices=["do-block", "upsert", "copy"])
+    parser.add_argument("--images", action="store_true", help="Also download images")
+    parser.add_argument("--data-route", action="store_true", help="Fetch product data through the Next.js data route")
+    parser.add_argument("--rotate-build-every", type=int, default=0, help="Server build id rotation (0 = never)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    server = multiprocessing.Process(
+        target=serve,
+        args=(host, args.port),
+        kwargs={"pages": args.pages, "per_page": args.per_page, "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "image_bytes": args.image_bytes,
+                "rotate_build_every": args.rotate_build_every},
+        daemon=True,
+    )
+    server.start()
+    output = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    try:
+        wait_for_port(host, args.port)
+        with tempfile.TemporaryDirectory(prefix="pnj-bench-") as workdir:
+            os.chdir(workdir)
+            try:
+                results = asyncio.run(run_crawl(args, f"http://{host}:{args.port}"))
+            finally:
+                os.chdir(cwd)
+        with urllib.request.urlopen(f"http://{host}:{args.port}/_stats") as response:
+            server_stats = json.load(response)
+    finally:
+        server.terminate()
+        server.join()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "log_level")},
+        "results": results,
+        "server": server_stats,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Micro-benchmark and cross-check of the PageExtractor backends.
+
+Usage:
+    python benchmark/ExtractorBenchmark.py [saved_page.html | directory ...] [--repeat N]
+
+Pass PNJ listing/product pages saved with e.g.
+    curl -o pages/product.html https://www.pnj.com.vn/<product-url>
+Without arguments a synthetic product page and listing page are used.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from PageExtractor import EXTRACTORS, lxml_html  # noqa: E402
+from PNJScraper import PNJScraper  # noqa: E402
+
+
+def synthetic_pages() -> Dict[str, bytes]:
+    """Build one product page and one listing page shaped like pnj.com.vn"""
+    product = {
+        "props": {"pageProps": {"dataServerSide": {
+            "product_id": 1234, "product": "Nhẫn Vàng 18K đính đá ECZ", "product_code": "GNXMXMY000001",
+            "full_description": "<p>" + "Mô tả sản phẩm " * 400 + "</p>", "price": 5120000, "status": "A",
+            "amount": 4,
+            "category_seo": [{"category_id": 7, "category": "Nhẫn", "seo_name_url": "nhan"}],
+            "images": [f"https://cdn.pnj.io/images/detailed/1/{i}.png" for i in range(8)],
+            "features": [{"feature": f"Thuộc tính {i}", "text": f"Giá trị {i}"} for i in range(12)],
+            "size_modifier_prices": {str(size): {"price": 5120000 + size} for size in range(6, 20)},
+        }}},
+    }
+    filler = "".join(f'<div class="menu-item"><a href="/menu/{i}">Menu {i}</a></div>' for i in range(3000))
+    product_page = (
+        f'<!DOCTYPE html><html><head><title>PNJ</title></head><body>{filler}'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(product, ensure_ascii=False)}</script>'
+        f'</body></html>'
+    )
+    items = "".join(
+        f'<div class="product-item"><div class="product-image"><a href="/nhan/product-{i}.html">'
+        f'<img src="/img/{i}.png"></a></div><h3>Nhẫn {i}</h3></div>'
+        for i in range(40)
+    )
+    # Related products after the listing container must not be picked up as listing items
+    related = ('<div class="related"><div class="product-item"><div class="product-image">'
+               '<a href="/nhan/related.html"><img src="/img/related.png"></a></div></div></div>')
+    listing_page = (f'<html><body>{filler}<div id="ajax_pagination_contents"><div class="row">{items}</div></div>'
+                    f'{related}</body></html>')
+    return {"synthetic_product.html": product_page.encode("utf-8"),
+            "synthetic_listing.html": listing_page.encode("utf-8")}
+
+
+def load_pages(paths: List[str]) -> Dict[str, bytes]:
+    pages = {}
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, "*.htm*"))) if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, "rb") as f:
+                pages[os.path.basename(file)] = f.read()
+    return pages
+
+
+def run_backend(extractor, markup: bytes):
+    data = extractor.extract_next_data(markup)
+    if data is not None:
+        return "product", data
+    return "listing", extractor.extract_product_links(markup)
+
+
+# Set from the wall clock by extract_records, so they differ between two calls that straddle a second
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def comparable_records(scraper: PNJScraper, data: Dict) -> Optional[Dict]:
+    """extract_records() output with the timestamp fields left out"""
+    random.seed(0)
+    records = scraper.extract_records(data)
+    if records is None:
+        return None
+    return {table: [{key: value for key, value in row.items() if key not in TIMESTAMP_FIELDS} for row in rows]
+            if isinstance(rows, list) else rows
+            for table, rows in records.items()}
+
+
+def check_correctness(pages: Dict[str, bytes], extractors: Dict, scraper: PNJScraper) -> bool:
+    """All backends must yield the same JSON, links and product records as bs4"""
+    ok = True
+    for name, markup in pages.items():
+        expected_kind, expected = run_backend(extractors["bs4"], markup)
+        expected_records = None
+        if expected_kind == "product":
+            expected_records = comparable_records(scraper, expected)
+
+        for backend, extractor in extractors.items():
+            kind, result = run_backend(extractor, markup)
+            records = None
+            if kind == "product":
+                records = comparable_records(scraper, result)
+            if kind != expected_kind or result != expected or records != expected_records:
+                ok = False
+                print(f"MISMATCH {name}: {backend} differs from bs4")
+    return ok
+
+
+def benchmark(pages: Dict[str, bytes], extractors: Dict, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    total_bytes = sum(len(markup) for markup in pages.values())
+    for backend, extractor in extractors.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for markup in pages.values():
+                run_backend(extractor, markup)
+        elapsed = time.perf_counter() - start
+        results[backend] = {
+            "seconds": round(elapsed, 4),
+            "pages_per_sec": round(repeat * len(pages) / elapsed, 1),
+            "mb_per_sec": round(repeat * total_bytes / elapsed / 1e6, 2),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PageExtractor backends on saved PNJ pages")
+    parser.add_argument("paths", nargs="*", help="Saved HTML pages or directories of them")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the page set per backend")
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths) if args.paths else synthetic_pages()
+    if not pages:
+        parser.error("no pages found")
+
+    extractors = {name: cls() for name, cls in EXTRACTORS.items() if name != "lxml" or lxml_html is not None}
+    scraper = PNJScraper("benchmark")
+    scraper.logger.setLevel("ERROR")
+
+    ok = check_correctness(pages, extractors, scraper)
+    results = benchmark(pages, extractors, args.repeat)
+    baseline = results["bs4"]["seconds"]
+    for result in results.values():
+        result["speedup_vs_bs4"] = round(baseline / result["seconds"], 1) if result["seconds"] else None
+
+    print(json.dumps({"pages": len(pages), "repeat": args.repeat, "consistent": ok, "backends": results}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
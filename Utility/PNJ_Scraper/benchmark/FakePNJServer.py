@@ -0,0 +1,200 @@
+"""Local stand-in for pnj.com.vn used by the offline benchmarks.
+
+Serves, for any item type:
+    /<item_type>/page-<n>/      listing pages (ajax_pagination_contents / product-image markup)
+    /<item_type>/<slug>-<id>.html   product pages with a __NEXT_DATA__ payload
+    /_next/data/<build_id>/<item_type>/<slug>-<id>.html.json   the same pageProps as JSON (Next.js data route)
+    /images/<id>_<n>.png        product images
+
+Usage:
+    python benchmark/FakePNJServer.py --port 8765 --pages 20 --latency-ms 20 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+from typing import Dict, Optional
+
+from aiohttp import web
+
+MATERIAL_WORDS = ["Vàng 18K", "Bạc", "Kim cương", "Ngọc trai", "Đá quý", "Bạch kim", "Vàng trắng 14K"]
+
+
+def make_payload(product_id: int, base_url: str, images: int = 6, features: int = 10, sizes: int = 12,
+                 build_id: str = "benchmark-build") -> Dict:
+    """A __NEXT_DATA__ document shaped like a PNJ product page"""
+    rng = random.Random(product_id)
+    name = f"Nhẫn {rng.choice(MATERIAL_WORDS)} đính đá ECZ PNJ {product_id}"
+    price = rng.randrange(1_000_000, 50_000_000, 10_000)
+    category_id = 100 + product_id % 8
+    return {
+        "props": {
+            "pageProps": {
+                "dataServerSide": {
+                    "product_id": product_id,
+                    "product": name,
+                    "product_code": f"GNXMXMY{product_id:06d}",
+                    "full_description": "<p>" + f"Mô tả chi tiết sản phẩm {name}. " * 40 + "</p>",
+                    "price": price,
+                    "status": "A" if rng.random() < 0.9 else "D",
+                    "amount": rng.randrange(0, 50),
+                    "category_seo": [{"category_id": category_id, "category": f"Danh mục {category_id}",
+                                      "seo_name_url": f"danh-muc-{category_id}"}],
+                    # Every product shares image 0 with product_id % 5 to exercise image dedup
+                    "images": [f"{base_url}/images/{product_id % 5 if i == 0 else product_id}_{i}.png"
+                               for i in range(images)],
+                    "features": [{"feature": f"Thuộc tính {i}", "text": f"Giá trị {rng.randrange(100)}"}
+                                 for i in range(features)],
+                    "size_modifier_prices": {str(6 + i): {"price": price + i * 100_000} for i in range(sizes)},
+                },
+            },
+            "__N_SSP": True,
+        },
+        "page": "/[slug]",
+        "query": {"slug": f"product-{product_id}"},
+        "buildId": build_id,
+    }
+
+
+def page_shell(body: str, filler_items: int) -> str:
+    """Wrap content in a page with header/menu markup, roughly the weight of a real PNJ page"""
+    menu = "".join(f'<li class="menu-item"><a href="/menu/{i}">Danh mục {i}</a></li>' for i in range(filler_items))
+    return (f'<!DOCTYPE html><html lang="vi"><head><meta charset="utf-8"><title>PNJ</title></head>'
+            f'<body><header><ul class="menu">{menu}</ul></header>{body}</body></html>')
+
+
+def render_product_page(product_id: int, base_url: str, filler_items: int = 1500,
+                        build_id: str = "benchmark-build") -> str:
+    payload = json.dumps(make_payload(product_id, base_url, build_id=build_id), ensure_ascii=False)
+    body = (f'<div id="__next"><h1>Sản phẩm {product_id}</h1></div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{payload}</script>')
+    return page_shell(body, filler_items)
+
+
+def render_listing_page(item_type: str, page: int, per_page: int, base_url: str, filler_items: int = 1500) -> str:
+    first = (page - 1) * per_page + 1
+    items = "".join(
+        f'<div class="product-item"><div class="product-image">'
+        f'<a href="{base_url}/{item_type}/product-{product_id}.html"><img src="/thumb/{product_id}.png"></a>'
+        f'</div><h3 class="product-title">Sản phẩm {product_id}</h3></div>'
+        for product_id in range(first, first + per_page)
+    )
+    return page_shell(f'<div id="ajax_pagination_contents">{items}</div>', filler_items)
+
+
+class FakePNJServer:
+    """aiohttp application with configurable size, latency and error injection"""
+
+    def __init__(self, pages: int = 10, per_page: int = 20, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, image_bytes: int = 100_000, seed: int = 0, rotate_build_every: int = 0):
+        self.pages = pages
+        self.per_page = per_page
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.image_bytes = image_bytes
+        self.rng = random.Random(seed)
+        # A new build id every rotate_build_every product requests simulates deploys (0 = never)
+        self.rotate_build_every = rotate_build_every
+        self.product_requests = 0
+        self.requests = 0
+        self.errors = 0
+
+    def base_url(self, request: web.Request) -> str:
+        return f"{request.scheme}://{request.host}"
+
+    async def _delay(self):
+        delay = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _injected_error(self) -> Optional[web.Response]:
+        """Return an injected failure, or None"""
+        if self.rng.random() >= self.error_rate:
+            return None
+        self.errors += 1
+        if self.rng.random() < 0.5:
+            return web.Response(status=429, headers={"Retry-After": "0.1"})
+        return web.Response(status=503)
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        await self._delay()
+        error = self._injected_error()
+        return error if error is not None else await handler(request)
+
+    async def listing(self, request: web.Request) -> web.Response:
+        page = int(request.match_info["page"])
+        if page > self.pages:
+            return web.Response(text=page_shell('<div id="ajax_pagination_contents"></div>', 10),
+                                content_type="text/html")
+        text = render_listing_page(request.match_info["item_type"], page, self.per_page, self.base_url(request))
+        return web.Response(text=text, content_type="text/html")
+
+    @property
+    def build_id(self) -> str:
+        if not self.rotate_build_every:
+            return "benchmark-build"
+        return f"benchmark-build-{self.product_requests // self.rotate_build_every}"
+
+    async def product(self, request: web.Request) -> web.Response:
+        self.product_requests += 1
+        product_id = int(request.match_info["product_id"])
+        text = render_product_page(product_id, self.base_url(request), build_id=self.build_id)
+        return web.Response(text=text, content_type="text/html")
+
+    async def data_route(self, request: web.Request) -> web.Response:
+        self.product_requests += 1
+        if request.match_info["build_id"] != self.build_id:
+            return web.Response(status=404)
+        payload = make_payload(int(request.match_info["product_id"]), self.base_url(request), build_id=self.build_id)
+        return web.json_response(payload["props"], dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    async def image(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"].encode("utf-8")
+        body = (name * (self.image_bytes // len(name) + 1))[:self.image_bytes]
+        return web.Response(body=body, content_type="image/png")
+
+    async def stats(self, request: web.Request) -> web.Response:
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        divisor = 1024 * 1024 if platform.system() == "Darwin" else 1024
+        peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)
+        return web.json_response({"requests": self.requests, "errors": self.errors, "peak_rss_mb": peak_rss_mb})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/_stats", self.stats)
+        app.router.add_get("/images/{name}", self.image)
+        app.router.add_get("/_next/data/{build_id}/{item_type}/{slug}-{product_id:\\d+}.html.json", self.data_route)
+        app.router.add_get("/{item_type}/page-{page:\\d+}/", self.listing)
+        app.router.add_get("/{item_type}/{slug}-{product_id:\\d+}.html", self.product)
+        return app
+
+
+def serve(host: str, port: int, **options):
+    """Run the server until the process is terminated"""
+    web.run_app(FakePNJServer(**options).create_app(), host=host, port=port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic pnj.com.vn for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-bytes", type=int, default=100_000)
+    parser.add_argument("--rotate-build-every", type=int, default=0)
+    args = parser.parse_args()
+    serve(args.host, args.port, pages=args.pages, per_page=args.per_page, latency_ms=args.latency_ms,
+          jitter_ms=args.jitter_ms, error_rate=args.error_rate, image_bytes=args.image_bytes,
+          rotate_build_every=args.rotate_build_every)
+
+
+if __name__ == "__main__":
+    main()
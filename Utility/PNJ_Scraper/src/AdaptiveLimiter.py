@@ -0,0 +1,109 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter for outgoing requests.
+
+    The limit grows additively (about +1 per limit successful requests) while
+    latency stays within latency_tolerance x the baseline of its request class
+    (listing pages, product pages, data route JSON, conditional GETs, images
+    each have their own), and is cut
+    multiplicatively on throttling, server errors and timeouts, at most once
+    per cooldown so a burst of failures counts as one signal. pause() stops
+    all new requests until a server-given Retry-After has passed. A baseline
+    is the fastest latency seen, drifting up towards recent latencies by
+    baseline_decay per request, so one unusually fast response does not stop
+    the increase for good.
+    """
+
+    def __init__(self, initial: int = 10, min_limit: int = 1, max_limit: int = 50,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0, cooldown: float = 1.0,
+                 baseline_decay: float = 0.05):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.baseline_decay = baseline_decay
+
+        self.in_flight = 0
+        self.condition: Optional[asyncio.Condition] = None
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.baselines: Dict[str, float] = {}
+
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so the limiter binds to the running event loop
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Hold one request slot for the duration of the block"""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay > 0:
+                    condition.release()
+                    try:
+                        await asyncio.sleep(delay)
+                    finally:
+                        await condition.acquire()
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await condition.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def on_success(self, latency: float, request_class: str = "default"):
+        """Additive increase while latency is healthy for its request class"""
+        self.successes += 1
+        baseline = self.baselines.get(request_class)
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            baseline += (latency - baseline) * self.baseline_decay
+        self.baselines[request_class] = baseline
+        if latency <= baseline * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def on_failure(self):
+        """Multiplicative decrease on throttling, 5xx or timeouts"""
+        self.failures += 1
+        now = time.monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.last_decrease = now
+            self.decreases += 1
+
+    def pause(self, seconds: float):
+        """Hold back all new requests for the given time (Retry-After)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "limit": round(self.limit, 2),
+            "peak_limit": round(self.peak_limit, 2),
+            "successes": self.successes,
+            "failures": self.failures,
+            "decreases": self.decreases,
+            "latency_baselines_ms": {name: round(value * 1000, 2) for name, value in sorted(self.baselines.items())},
+        }
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+# Marks the end of a stage's input; each worker puts it back so its siblings see it too
+_STOP = object()
+
+
+class PipelineStage:
+    """One named step of a CrawlPipeline and its counters"""
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Optional[Iterable[Any]]]],
+                 workers: int = 1, queue_size: int = 100):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker, got {workers}")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "emitted": self.emitted,
+            "errors": self.errors,
+        }
+
+
+class CrawlPipeline:
+    """Chain of async stages connected by bounded queues.
+
+    Each stage handler takes one item and returns an iterable of items for the
+    next stage (or None). The last stage is a sink and its output is dropped.
+    Bounded queues give backpressure, so memory stays flat however large the
+    source is.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.stages: List[PipelineStage] = []
+
+    def add_stage(self, name: str, handler: Callable[[Any], Awaitable[Optional[Iterable[Any]]]],
+                  workers: int = 1, queue_size: int = 100) -> "CrawlPipeline":
+        """Append a stage; returns self so stages can be chained"""
+        self.stages.append(PipelineStage(name, handler, workers, queue_size))
+        return self
+
+    async def _feed(self, source: Union[Iterable[Any], AsyncIterable[Any]], queue: asyncio.Queue):
+        if hasattr(source, "__aiter__"):
+            # Async sources (e.g. a shared work queue) are only pulled while the first queue has room
+            async for item in source:
+                await queue.put(item)
+        else:
+            for item in source:
+                await queue.put(item)
+        await queue.put(_STOP)
+
+    async def _worker(self, stage: PipelineStage, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue]):
+        while True:
+            item = await in_queue.get()
+            if item is _STOP:
+                await in_queue.put(_STOP)
+                return
+
+            try:
+                results = await stage.handler(item)
+            except Exception as e:
+                stage.errors += 1
+                self.logger.error(f"Stage {stage.name} failed on {item!r:.200}: {e}")
+                continue
+
+            stage.processed += 1
+            if results is None or out_queue is None:
+                continue
+            for result in results:
+                stage.emitted += 1
+                await out_queue.put(result)
+
+    async def _run_stage(self, stage: PipelineStage, in_queue: asyncio.Queue, out_queue: Optional[asyncio.Queue]):
+        await asyncio.gather(*(self._worker(stage, in_queue, out_queue) for _ in range(stage.workers)))
+        if out_queue is not None:
+            await out_queue.put(_STOP)
+
+    async def run(self, source: Union[Iterable[Any], AsyncIterable[Any]]) -> Dict[str, Dict[str, int]]:
+        """Push every item of source through all stages and wait until they drain"""
+        if not self.stages:
+            raise ValueError("CrawlPipeline has no stages")
+
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        tasks = [asyncio.create_task(self._feed(source, queues[0]))]
+        for i, stage in enumerate(self.stages):
+            out_queue = queues[i + 1] if i + 1 < len(queues) else None
+            tasks.append(asyncio.create_task(self._run_stage(stage, queues[i], out_queue)))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {stage.name: stage.get_stats() for stage in self.stages}
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+
+class CrawlState:
+    """SQLite store of crawl progress and product content hashes.
+
+    A crawl covers one item type and page range. Listing pages and product
+    URLs are recorded per crawl with their status, so an interrupted crawl
+    resumes where it stopped. Product content hashes are kept across crawls
+    so unchanged products can be skipped by later runs.
+
+    Page and product updates are staged in the open transaction and only
+    committed by commit(), which the caller runs right after the matching SQL
+    has been flushed: a crash never records a product the output does not
+    contain, it only makes the next run list a few pages again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        self.crawl_id: Optional[int] = None
+        self.resumed = False
+
+    def open(self):
+        if self.db is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS crawls ("
+            "    id INTEGER PRIMARY KEY AUTOINCREMENT, item_type TEXT NOT NULL, start_page INTEGER NOT NULL,"
+            "    end_page INTEGER NOT NULL, started_at REAL NOT NULL, finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "    crawl_id INTEGER NOT NULL, page INTEGER NOT NULL, status TEXT NOT NULL,"
+            "    PRIMARY KEY (crawl_id, page));"
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "    crawl_id INTEGER NOT NULL, url TEXT NOT NULL, page INTEGER NOT NULL, status TEXT NOT NULL,"
+            "    updated_at REAL NOT NULL, PRIMARY KEY (crawl_id, url));"
+            "CREATE TABLE IF NOT EXISTS product_hashes ("
+            "    product_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, url TEXT, updated_at REAL NOT NULL);"
+        )
+        self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def begin_crawl(self, item_type: str, start_page: int, end_page: int, resume: bool = True) -> int:
+        """Continue the last unfinished crawl of the same range, or start a new one"""
+        self.open()
+        row = None
+        if resume:
+            row = self.db.execute(
+                "SELECT id FROM crawls WHERE item_type = ? AND start_page = ? AND end_page = ? "
+                "AND finished_at IS NULL ORDER BY id DESC LIMIT 1",
+                (item_type, start_page, end_page),
+            ).fetchone()
+        if row is not None:
+            self.crawl_id = row[0]
+            self.resumed = True
+        else:
+            cursor = self.db.execute(
+                "INSERT INTO crawls (item_type, start_page, end_page, started_at) VALUES (?, ?, ?, ?)",
+                (item_type, start_page, end_page, time.time()),
+            )
+            self.crawl_id = cursor.lastrowid
+            self.resumed = False
+        self.db.commit()
+        return self.crawl_id
+
+    def finish_crawl(self):
+        self.db.execute("UPDATE crawls SET finished_at = ? WHERE id = ?", (time.time(), self.crawl_id))
+        self.db.commit()
+
+    def is_page_done(self, page: int) -> bool:
+        row = self.db.execute(
+            "SELECT status FROM pages WHERE crawl_id = ? AND page = ?", (self.crawl_id, page)
+        ).fetchone()
+        return row is not None and row[0] == "done"
+
+    def pending_urls(self, page: int) -> List[str]:
+        """URLs found on an already listed page that were not processed yet"""
+        return [url for url, in self.db.execute(
+            "SELECT url FROM urls WHERE crawl_id = ? AND page = ? AND status = 'pending'", (self.crawl_id, page)
+        )]
+
+    def record_page(self, page: int, urls: List[str]) -> List[str]:
+        """Mark a listing page done (persisted by the next commit()); returns the URLs new to this crawl"""
+        now = time.time()
+        new_urls = []
+        for url in urls:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO urls (crawl_id, url, page, status, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+                (self.crawl_id, url, page, now),
+            )
+            if cursor.rowcount:
+                new_urls.append(url)
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages (crawl_id, page, status) VALUES (?, ?, 'done')", (self.crawl_id, page)
+        )
+        return new_urls
+
+    def is_unchanged(self, product_id, content_hash: str) -> bool:
+        row = self.db.execute(
+            "SELECT content_hash FROM product_hashes WHERE product_id = ?", (str(product_id),)
+        ).fetchone()
+        return row is not None and row[0] == content_hash
+
+    def stage_product(self, url: str, product_id, content_hash: str):
+        """Record a processed product; persisted by the next commit()"""
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO product_hashes (product_id, content_hash, url, updated_at) VALUES (?, ?, ?, ?)",
+            (str(product_id), content_hash, url, now),
+        )
+        self.stage_url_done(url)
+
+    def forget_products(self, product_ids: List):
+        """Undo stage_product for products whose rows were not loaded, so they count as new and pending again"""
+        for product_id in product_ids:
+            self.db.execute(
+                "UPDATE urls SET status = 'pending', updated_at = ? WHERE crawl_id = ? "
+                "AND url IN (SELECT url FROM product_hashes WHERE product_id = ?)",
+                (time.time(), self.crawl_id, str(product_id)),
+            )
+            self.db.execute("DELETE FROM product_hashes WHERE product_id = ?", (str(product_id),))
+
+    def stage_url_done(self, url: str):
+        self.db.execute(
+            "UPDATE urls SET status = 'done', updated_at = ? WHERE crawl_id = ? AND url = ?",
+            (time.time(), self.crawl_id, url),
+        )
+
+    def commit(self):
+        self.db.commit()
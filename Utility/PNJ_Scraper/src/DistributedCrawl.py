@@ -0,0 +1,414 @@
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from CrawlPipeline import CrawlPipeline
+from PNJScraper import PNJScraper
+from SqlWriter import TABLES, CopyWriter, create_sql_writer, unique_path_prefix
+from WorkQueue import PAGE, PRODUCT, WorkQueue
+
+
+class DistributedWorker:
+    """One worker of a crawl shared by several processes or machines.
+
+    Listing pages and product URLs come from a WorkQueue instead of a page
+    range: pages are expanded into product items for every worker to pick up,
+    products are fetched, extracted and written to this worker's own partition
+    (crawl_dir/partitions/<worker_id>), and merge_partitions() combines the
+    partitions into one import afterwards. Each product id is claimed in the
+    queue, so it lands in one partition only. Leases are renewed while the
+    worker lives; product items are acknowledged only once their SQL has been
+    flushed. Queue calls run in worker threads, so waiting on the shared
+    SQLite lock never holds up the fetches in flight.
+    """
+
+    def __init__(self, scraper: PNJScraper, queue: WorkQueue, crawl_dir: str, worker_id: Optional[str] = None,
+                 lease_batch: int = 20, max_in_flight: Optional[int] = None, poll_interval: float = 1.0):
+        self.scraper = scraper
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.partition_dir = partition_dir(crawl_dir, self.worker_id)
+        self.lease_batch = lease_batch
+        # Lease no more than the pipeline is working on, so idle workers find something left to take
+        self.max_in_flight = max_in_flight or max(lease_batch, 2 * scraper.detail_workers)
+        self.poll_interval = poll_interval
+        self.logger = scraper.logger
+
+        self.writer = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.slot_free: Optional[asyncio.Event] = None
+        # Items leased by this worker and not acknowledged yet; those still in the pipeline; listing pages among them
+        self.held = 0
+        self.in_flight = 0
+        self.pages_in_flight = 0
+
+        self.pages = 0
+        self.products = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    async def source(self):
+        """Lease items until the queue holds nothing but this worker's own in-flight products"""
+        while True:
+            while self.in_flight >= self.max_in_flight:
+                self.slot_free.clear()
+                await self.slot_free.wait()
+            items = await asyncio.to_thread(self.queue.lease, self.worker_id,
+                                            min(self.lease_batch, self.max_in_flight - self.in_flight))
+            if items:
+                for item_id, kind, value in items:
+                    self.held += 1
+                    self.in_flight += 1
+                    if kind == PAGE:
+                        self.pages_in_flight += 1
+                    yield item_id, kind, value
+                continue
+
+            # Nothing to lease: acknowledge what is buffered so idle workers never wait on each other
+            await self.checkpoint()
+            if self.pages_in_flight == 0 and await asyncio.to_thread(self.queue.unfinished_count) <= self.held:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def heartbeat(self):
+        """Renew this worker's leases and claims; a failed renewal is logged and tried again on the next beat"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.queue.renew, self.worker_id)
+            except Exception as e:
+                self.logger.error(f"Failed to renew the leases of worker {self.worker_id}: {e!r}")
+
+    async def give_up(self, item_id: int, error: str, retry: bool = False):
+        """Drop an item from this worker: back to the queue for another try, or failed for good"""
+        if retry:
+            await asyncio.to_thread(self.queue.release, item_id, error)
+        else:
+            self.failed += 1
+            await asyncio.to_thread(self.queue.fail, item_id, error)
+        self.held -= 1
+        self.left_pipeline()
+
+    def left_pipeline(self):
+        self.in_flight -= 1
+        self.slot_free.set()
+
+    async def route_stage(self, item: Tuple[int, str, str]) -> List[Tuple[int, str]]:
+        """Pipeline stage: expand a listing page into product items, pass product items on"""
+        item_id, kind, value = item
+        if kind == PRODUCT:
+            return [(item_id, value)]
+
+        try:
+            page = int(value)
+            urls = await self.scraper.scrape_product_links(page)
+            if not urls and f"{self.scraper.base_url}/page-{page}/" in self.scraper.dropped_urls:
+                await self.give_up(item_id, "listing page could not be fetched", retry=True)
+                return []
+            added = await asyncio.to_thread(self.queue.enqueue, PRODUCT, urls)
+            await asyncio.to_thread(self.queue.ack, item_id)
+            self.held -= 1
+            self.left_pipeline()
+            self.pages += 1
+            self.logger.info(f"Page {page}: queued {added} of {len(urls)} products")
+        except Exception as e:
+            await self.give_up(item_id, repr(e), retry=True)
+        finally:
+            self.pages_in_flight -= 1
+        return []
+
+    async def detail_stage(self, item: Tuple[int, str]) -> List[Tuple[int, str, bytes, bool]]:
+        """Pipeline stage: product item -> raw product page (see PNJScraper.detail_stage)"""
+        item_id, url = item
+        try:
+            pages = await self.scraper.detail_stage(url)
+        except Exception as e:
+            await self.give_up(item_id, repr(e), retry=True)
+            return []
+        if not pages:
+            await self.give_up(item_id, self.scraper.dropped_urls.get(url, "product page could not be fetched"))
+            return []
+        return [(item_id,) + page for page in pages]
+
+    async def extraction_stage(self, item: Tuple[int, str, bytes, bool]) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Pipeline stage: raw product page -> table rows (see PNJScraper.extraction_stage)"""
+        item_id, *page = item
+        try:
+            results = await self.scraper.extraction_stage(tuple(page))
+        except Exception as e:
+            await self.give_up(item_id, repr(e))
+            return []
+        if not results:
+            await self.give_up(item_id, "no product data in page")
+            return []
+        return [(item_id,) + result for result in results]
+
+    async def sink_stage(self, item: Tuple[int, str, Dict[str, Any]]):
+        """Pipeline stage: claim the product id and write its rows to this worker's partition"""
+        item_id, url, records = item
+        product_id = records["products"][0].id
+        async with self.lock:
+            if not await asyncio.to_thread(self.queue.claim_product, product_id, self.worker_id):
+                # Listed under another URL that a different worker got first
+                self.duplicates += 1
+                self.queue.stage_done(item_id)
+                self.left_pipeline()
+                return
+            if self.scraper.archive is not None:
+                self.scraper.archive.append(product_id, records["archive_frame"])
+            self.queue.stage_done(item_id, product_id)
+            self.left_pipeline()
+            self.products += 1
+            if self.writer.add(records):
+                await self.flush()
+
+        if self.scraper.loader is not None and self.scraper.loader.add(records):
+            await self.scraper.loader.flush()
+        if self.scraper.download_images:
+            for img_data in records["images"]:
+                await self.scraper.image_downloader.put(img_data["image_url"])
+
+    async def flush(self):
+        """Flush the partition, then acknowledge the items it covers (caller holds the lock)"""
+        await asyncio.to_thread(self.scraper.flush_sql, self.writer)
+        self.held -= await asyncio.to_thread(self.queue.commit)
+
+    async def checkpoint(self):
+        async with self.lock:
+            if self.queue.staged_items:
+                await self.flush()
+
+    def build_pipeline(self) -> CrawlPipeline:
+        """Wire route -> detail fetch -> extraction -> partition sink"""
+        scraper = self.scraper
+        pipeline = CrawlPipeline(self.logger)
+        pipeline.add_stage("route", self.route_stage, scraper.discovery_workers, scraper.queue_size)
+        pipeline.add_stage("detail", self.detail_stage, scraper.detail_workers, scraper.queue_size)
+        pipeline.add_stage("extraction", self.extraction_stage, scraper.extraction_workers, scraper.queue_size)
+        pipeline.add_stage("sink", self.sink_stage, 1, scraper.queue_size)
+        return pipeline
+
+    async def run(self) -> Dict[str, Any]:
+        """Work until the shared queue is drained"""
+        scraper = self.scraper
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.writer = create_sql_writer(
+            scraper.output_format,
+            os.path.join(self.partition_dir, f"{scraper.item_type}_{timestamp}"),
+            chunk_rows=scraper.sql_chunk_rows,
+            max_file_bytes=scraper.sql_max_file_bytes,
+            max_file_rows=scraper.sql_max_file_rows,
+        )
+        self.lock = asyncio.Lock()
+        self.slot_free = asyncio.Event()
+        self.logger.info(f"Worker {self.worker_id} writing to {self.partition_dir}")
+
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            if scraper.download_images:
+                await scraper.image_downloader.start()
+            if scraper.loader is not None:
+                await scraper.loader.start()
+            stats = await self.build_pipeline().run(self.source())
+            if scraper.download_images:
+                await scraper.image_downloader.close()
+            if scraper.loader is not None:
+                await scraper.loader.close()
+        finally:
+            heartbeat.cancel()
+            with scraper.metrics.timer("sql_write"):
+                self.writer.close()
+            if scraper.archive is not None:
+                scraper.archive.flush()
+            self.held -= await asyncio.to_thread(self.queue.commit)
+
+        result = {
+            "worker": self.worker_id,
+            "pages": self.pages,
+            "products": self.products,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "rows": self.writer.row_counts,
+            "pipeline": stats,
+        }
+        self.logger.info(f"Worker {self.worker_id} done: {self.pages} pages, {self.products} products, "
+                         f"{self.duplicates} duplicates, {self.failed} failed")
+        if scraper.metrics.enabled:
+            scraper.metrics.write_report(os.path.join(self.partition_dir, f"metrics_{timestamp}.json"), {
+                **result,
+                "http_pool": scraper.http.get_stats(),
+                "limiter": scraper.limiter.get_stats(),
+            })
+        if scraper.loader is not None:
+            scraper.loader.check()
+        return result
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def crawls_root(item_type: str) -> str:
+    return os.path.join("data", item_type, "distributed")
+
+
+def new_crawl_dir(item_type: str, crawl_id: Optional[str] = None) -> str:
+    """Directory of a crawl (a fresh, timestamped one unless crawl_id names it), recorded as the latest crawl"""
+    root = crawls_root(item_type)
+    if crawl_id is None:
+        crawl_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(root, crawl_id)):
+            suffix += 1
+            crawl_id = f"{crawl_id.split('-')[0]}-{suffix}"
+    crawl_dir = os.path.join(root, crawl_id)
+    os.makedirs(crawl_dir, exist_ok=True)
+    with open(os.path.join(root, "LATEST"), "w", encoding="utf-8") as f:
+        f.write(crawl_id + "\n")
+    return crawl_dir
+
+
+def latest_crawl_dir(item_type: str) -> str:
+    """Directory of the most recently seeded crawl"""
+    root = crawls_root(item_type)
+    try:
+        with open(os.path.join(root, "LATEST"), encoding="utf-8") as f:
+            return os.path.join(root, f.read().strip())
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No crawl has been seeded under {root}, run 'seed' or 'run' first")
+
+
+def queue_path(crawl_dir: str) -> str:
+    return os.path.join(crawl_dir, "queue.sqlite3")
+
+
+def partition_dir(crawl_dir: str, worker_id: str) -> str:
+    return os.path.join(crawl_dir, "partitions", worker_id)
+
+
+def seed(crawl_dir: str, start_page: int, end_page: int) -> int:
+    """Queue the listing pages of a crawl; pages already queued are left alone"""
+    queue = WorkQueue(queue_path(crawl_dir))
+    try:
+        return queue.enqueue(PAGE, (str(page) for page in range(start_page, end_page + 1)))
+    finally:
+        queue.close()
+
+
+def run_worker(item_type: str, crawl_dir: str, options: Dict[str, Any], worker_id: Optional[str] = None,
+               lease_seconds: float = 120.0):
+    """Process entry point: run one DistributedWorker until the queue is drained"""
+    worker_id = worker_id or default_worker_id()
+
+    async def main():
+        queue = WorkQueue(queue_path(crawl_dir), lease_seconds=lease_seconds)
+        try:
+            # The response cache and crawl state are single-process stores; workers share the queue instead
+            async with PNJScraper(item_type, use_cache=False, use_state=False,
+                                  archive_dir=os.path.join(partition_dir(crawl_dir, worker_id), "archive"),
+                                  **options) as scraper:
+                return await DistributedWorker(scraper, queue, crawl_dir, worker_id).run()
+        finally:
+            queue.close()
+
+    return asyncio.run(main())
+
+
+def merge_partitions(crawl_dir: str, output_format: str) -> List[str]:
+    """Combine the SQL of every worker partition into one import; returns the merged paths"""
+    partitions = os.path.join(crawl_dir, "partitions")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(os.path.join(crawl_dir, "merged"), exist_ok=True)
+    prefix = unique_path_prefix(os.path.join(crawl_dir, "merged", f"merged_{timestamp}"))
+
+    if output_format == "copy":
+        # One data file per table and one load script; DISTINCT ON in the script drops cross-partition duplicates
+        writer = CopyWriter(prefix)
+        for table in TABLES:
+            for path in sorted(glob.glob(os.path.join(partitions, "*", f"*_{table}.copy"))):
+                with open(path, encoding="utf-8") as source:
+                    shutil.copyfileobj(source, writer.files[table])
+        writer.close()
+        return writer.paths
+
+    # Partition scripts are self-contained BEGIN ... COMMIT chunks of upserts, so they concatenate
+    merged_path = f"{prefix}.sql"
+    with open(merged_path, "x", encoding="utf-8") as merged:
+        for path in sorted(glob.glob(os.path.join(partitions, "*", "*.sql"))):
+            with open(path, encoding="utf-8") as source:
+                shutil.copyfileobj(source, merged)
+            merged.write("\n")
+    return [merged_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl PNJ with several workers sharing one work queue")
+    parser.add_argument("command", choices=["run", "seed", "worker", "merge", "status"])
+    parser.add_argument("item_type")
+    parser.add_argument("--crawl-id", help="Crawl to seed, join, merge or inspect: 'run' and 'seed' start a new, "
+                                           "timestamped crawl by default, the other commands use the latest one")
+    parser.add_argument("--crawl-dir", help="Queue and partitions, overriding data/<item_type>/distributed/<crawl id>")
+    parser.add_argument("--start-page", type=int, default=1)
+    parser.add_argument("--end-page", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes started by 'run'")
+    parser.add_argument("--worker-id", help="Stable id for 'worker' (default <hostname>-<pid>)")
+    parser.add_argument("--lease-seconds", type=float, default=120.0)
+    parser.add_argument("--output-format", default="upsert", choices=["do-block", "upsert", "copy"])
+    parser.add_argument("--max-concurrent-requests", type=int, default=10)
+    parser.add_argument("--process-workers", type=int, default=0)
+    parser.add_argument("--base-url")
+    parser.add_argument("--data-route", action="store_true")
+    args = parser.parse_args()
+
+    # Every crawl gets its own queue and partitions, so a new crawl neither skips pages an earlier one finished
+    # nor merges that crawl's output
+    if args.crawl_dir:
+        crawl_dir = args.crawl_dir
+    elif args.command in ("run", "seed"):
+        crawl_dir = new_crawl_dir(args.item_type, args.crawl_id)
+    elif args.crawl_id:
+        crawl_dir = os.path.join(crawls_root(args.item_type), args.crawl_id)
+    else:
+        crawl_dir = latest_crawl_dir(args.item_type)
+    options = {
+        "output_format": args.output_format,
+        "max_concurrent_requests": args.max_concurrent_requests,
+        "process_workers": args.process_workers,
+        "base_url": args.base_url,
+        "use_data_route": args.data_route,
+    }
+
+    if args.command in ("run", "seed"):
+        added = seed(crawl_dir, args.start_page, args.end_page)
+        print(f"Queued {added} listing pages in {queue_path(crawl_dir)}")
+    if args.command == "worker":
+        run_worker(args.item_type, crawl_dir, options, args.worker_id, args.lease_seconds)
+    if args.command == "run":
+        processes = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(args.item_type, crawl_dir, options, None, args.lease_seconds))
+            for _ in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    if args.command in ("run", "merge"):
+        print(f"Merged SQL: {', '.join(merge_partitions(crawl_dir, args.output_format))}")
+    if args.command in ("run", "status"):
+        queue = WorkQueue(queue_path(crawl_dir))
+        print(json.dumps(queue.get_stats(), indent=2))
+        for kind, value, error in queue.failed_items():
+            print(f"failed {kind} {value}: {error}")
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
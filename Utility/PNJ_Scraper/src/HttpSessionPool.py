@@ -0,0 +1,120 @@
+from typing import Dict, Any, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+try:
+    import brotli  # noqa: F401  (aiohttp decodes "br" only when brotli is installed)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class HttpSessionPool:
+    """Long-lived aiohttp session with keep-alive pooling, DNS caching and pool stats"""
+
+    def __init__(self, max_connections: int = 100, max_connections_per_host: int = 10,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 total_timeout: float = 60.0, connect_timeout: float = 10.0,
+                 read_timeout: float = 30.0, headers: Optional[Dict[str, str]] = None):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = ClientTimeout(total=total_timeout, connect=connect_timeout, sock_read=read_timeout)
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) PNJScraper/1.0",
+            "Accept-Encoding": ACCEPT_ENCODING,
+        }
+        if headers:
+            self.headers.update(headers)
+
+        self.session: Optional[ClientSession] = None
+        self.connector: Optional[TCPConnector] = None
+
+        # Pool statistics, collected through aiohttp tracing hooks
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    async def __aenter__(self) -> "HttpSessionPool":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _create_trace_config(self) -> TraceConfig:
+        """Hook connection and DNS events so the pool can report reuse"""
+        trace_config = TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, context, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    async def open(self) -> ClientSession:
+        """Create the shared session if it is not open yet"""
+        if self.session is None or self.session.closed:
+            self.connector = TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self.session = ClientSession(
+                connector=self.connector,
+                timeout=self.timeout,
+                headers=self.headers,
+                auto_decompress=True,
+                trace_configs=[self._create_trace_config()],
+            )
+        return self.session
+
+    async def close(self):
+        """Close the session and every pooled connection"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.connector = None
+
+    @property
+    def open_connections(self) -> int:
+        """Connections currently held by the connector (in use + idle keep-alive)"""
+        if self.connector is None or self.connector.closed:
+            return 0
+        acquired = len(getattr(self.connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(self.connector, "_conns", {}).values())
+        return acquired + idle
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool usage"""
+        acquisitions = self.connections_created + self.connections_reused
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.connections_reused / acquisitions, 4) if acquisitions else 0.0,
+            "open_connections": self.open_connections,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
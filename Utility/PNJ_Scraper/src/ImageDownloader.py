@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from AdaptiveLimiter import AdaptiveLimiter
+from HttpSessionPool import HttpSessionPool
+from Metrics import Metrics
+from RetryPolicy import FetchError, RetryPolicy, parse_retry_after
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+_STOP = object()
+
+
+def _make_thumbnail(source: str, target: str, size: int):
+    """Process-pool task: write a thumbnail no larger than size x size"""
+    with Image.open(source) as img:
+        img.thumbnail((size, size))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        img.save(target, format=img.format)
+
+
+class ImageDownloader:
+    """Streams product images to a content-addressed store.
+
+    Each image is written to <image_dir>/<sha256[:2]>/<sha256><ext> while it is
+    downloaded, in chunks written from a worker thread, so identical images
+    shared by several products are stored once. manifest.tsv maps every URL to
+    its file; URLs already on disk are skipped. Downloads run on their own
+    worker tasks, fed through a bounded queue.
+    Requests go through a RetryPolicy (the scraper's, so images share its
+    limiter and backoff); URLs that still fail are kept in failed_urls.
+    Thumbnails, if enabled, are generated in a process pool.
+    """
+
+    def __init__(self, http: HttpSessionPool, image_dir: str, workers: int = 8, queue_size: int = 1000,
+                 chunk_size: int = 64 * 1024, thumbnail_size: int = 0, thumbnail_processes: int = 2,
+                 retry: Optional[RetryPolicy] = None, logger: Optional[logging.Logger] = None,
+                 metrics: Optional[Metrics] = None):
+        self.http = http
+        self.image_dir = image_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.metrics = metrics or Metrics(enabled=False)
+        self.retry = retry or RetryPolicy(AdaptiveLimiter(workers, max_limit=workers), logger=self.logger,
+                                          metrics=self.metrics)
+
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_processes = thumbnail_processes
+        if thumbnail_size and Image is None:
+            self.logger.warning("Pillow is not installed, thumbnails are disabled")
+            self.thumbnail_size = 0
+        self.thumbnail_executor: Optional[ProcessPoolExecutor] = None
+
+        self.manifest_path = os.path.join(image_dir, "manifest.tsv")
+        self.manifest: Dict[str, str] = {}
+        self.manifest_file = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks = []
+        self.in_flight: Dict[str, asyncio.Future] = {}
+
+        self.downloaded = 0
+        self.skipped = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.failed_urls: Dict[str, str] = {}
+        self.thumbnails = 0
+        self.bytes_downloaded = 0
+        self.started_at: Optional[float] = None
+        self.download_seconds = 0.0
+
+    def _load_manifest(self):
+        os.makedirs(os.path.join(self.image_dir, "tmp"), exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) >= 2:
+                        self.manifest[fields[0]] = fields[1]
+        self.manifest_file = open(self.manifest_path, "a", encoding="utf-8")
+
+    async def start(self):
+        """Load the manifest and start the download workers"""
+        if self.queue is not None:
+            return
+        await asyncio.to_thread(self._load_manifest)
+        if self.thumbnail_size:
+            # Spawned, not forked: the downloader already runs to_thread workers when the pool starts
+            self.thumbnail_executor = ProcessPoolExecutor(max_workers=self.thumbnail_processes,
+                                                          mp_context=multiprocessing.get_context("spawn"))
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.started_at = time.perf_counter()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def put(self, url: str):
+        """Queue an image URL, waiting while the queue is full"""
+        await self.queue.put(url)
+
+    async def _worker(self):
+        while True:
+            url = await self.queue.get()
+            if url is _STOP:
+                await self.queue.put(_STOP)
+                return
+            await self.download(url)
+
+    async def close(self, drain: bool = True):
+        """Stop the workers (after draining the queue unless drain is False) and release the thumbnail pool"""
+        if self.queue is not None:
+            if drain:
+                await self.queue.put(_STOP)
+            else:
+                for task in self.tasks:
+                    task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=not drain)
+            self.queue = None
+            self.tasks = []
+        if self.started_at is not None:
+            self.download_seconds = time.perf_counter() - self.started_at
+        if self.thumbnail_executor is not None:
+            self.thumbnail_executor.shutdown(wait=True)
+            self.thumbnail_executor = None
+        if self.manifest_file is not None:
+            self.manifest_file.close()
+            self.manifest_file = None
+
+    def is_downloaded(self, url: str) -> bool:
+        path = self.manifest.get(url)
+        return path is not None and os.path.exists(os.path.join(self.image_dir, path))
+
+    async def download(self, url: str) -> Optional[str]:
+        """Download one image unless it is already stored; returns its path relative to image_dir"""
+        if self.is_downloaded(url):
+            self.skipped += 1
+            return self.manifest[url]
+        if url in self.in_flight:
+            return await self.in_flight[url]
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[url] = future
+        try:
+            path = await self._download(url)
+            self.downloaded += 1
+        except Exception as e:
+            self.failed += 1
+            self.failed_urls[url] = repr(e)
+            self.logger.error(f"Failed to download image {url}: {e}")
+            path = None
+        finally:
+            del self.in_flight[url]
+        future.set_result(path)
+        return path
+
+    async def _download(self, url: str) -> str:
+        tmp_path, sha256 = await self.retry.run(url, lambda: self._stream(url), "image")
+        ext = os.path.splitext(urlparse(url).path)[1].lower() or ".bin"
+        path = os.path.join(sha256[:2], f"{sha256}{ext}")
+        is_new = await asyncio.to_thread(self._store, tmp_path, os.path.join(self.image_dir, path))
+        if not is_new:
+            self.deduplicated += 1
+
+        self.manifest[url] = path
+        self.manifest_file.write(f"{url}\t{path}\t{sha256}\n")
+        self.manifest_file.flush()
+
+        if is_new and self.thumbnail_executor is not None:
+            await self._thumbnail(path)
+        return path
+
+    async def _stream(self, url: str) -> Tuple[str, str]:
+        """One download attempt: stream the body to a temporary file; returns its path and sha256"""
+        session = await self.http.open()
+        tmp_path = os.path.join(self.image_dir, "tmp", f"{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    raise FetchError(url, response.status, parse_retry_after(response.headers))
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    digest.update(chunk)
+                    self.bytes_downloaded += len(chunk)
+                    with self.metrics.timer("image_write", len(chunk)):
+                        await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.remove, tmp_path)
+            raise
+        await asyncio.to_thread(f.close)
+        return tmp_path, digest.hexdigest()
+
+    @staticmethod
+    def _store(tmp_path: str, target: str) -> bool:
+        """Move a finished download into place; False if identical content was already stored"""
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return True
+
+    async def _thumbnail(self, path: str):
+        source = os.path.join(self.image_dir, path)
+        target = os.path.join(self.image_dir, "thumbnails", path)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self.thumbnail_executor, _make_thumbnail, source, target, self.thumbnail_size
+            )
+            self.thumbnails += 1
+        except Exception as e:
+            self.logger.warning(f"Failed to create thumbnail for {path}: {e}")
+
+    def get_stats(self) -> Dict[str, float]:
+        seconds = self.download_seconds or (time.perf_counter() - self.started_at if self.started_at else 0.0)
+        return {
+            "downloaded": self.downloaded,
+            "skipped_existing": self.skipped,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "thumbnails": self.thumbnails,
+            "bytes": self.bytes_downloaded,
+            "seconds": round(seconds, 3),
+            "bytes_per_sec": round(self.bytes_downloaded / seconds, 1) if seconds else 0.0,
+        }
@@ -0,0 +1,214 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Tuple
+
+# Latency bucket upper bounds in seconds, from 100us to 1 minute
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram of one stage, with its byte total and error count"""
+
+    __slots__ = ("counts", "count", "sum", "max", "bytes", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.errors = 0
+
+    def observe(self, seconds: float, nbytes: int = 0):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.bytes += nbytes
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation, capped at the largest one seen"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return min(LATENCY_BUCKETS[i], self.max)
+        return self.max
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "seconds": round(self.sum, 6),
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class _Timer:
+    """Context manager timing one operation; set .bytes inside the block to record a size"""
+
+    __slots__ = ("metrics", "name", "bytes", "started")
+
+    def __init__(self, metrics: "Metrics", name: str, nbytes: int):
+        self.metrics = metrics
+        self.name = name
+        self.bytes = nbytes
+        self.started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.bytes, exc_type is not None)
+        return False
+
+
+class _NullTimer:
+    """Shared no-op timer handed out while metrics are disabled"""
+
+    __slots__ = ("bytes",)
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Per-stage counters, byte totals and latency histograms of one crawl.
+
+    Code paths wrap their work in `with metrics.timer("stage"):`; while the
+    collector is disabled that returns one shared no-op object, so the cost is
+    a method call. Results are exported as a JSON run report and, optionally,
+    in the Prometheus text exposition format (e.g. for node_exporter's
+    textfile collector).
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = "pnj_scraper"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def timer(self, name: str, nbytes: int = 0):
+        """Time the enclosed block as one observation of the named stage"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, nbytes)
+
+    def observe(self, name: str, seconds: float, nbytes: int = 0, error: bool = False):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        if error:
+            histogram.errors += 1
+        else:
+            histogram.observe(seconds, nbytes)
+
+    def incr(self, name: str, value: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "stages": {name: histogram.get_stats() for name, histogram in sorted(self.histograms.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """Write the JSON run report, merged with any extra sections (pipeline, cache stats...)"""
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "elapsed_seconds": round(time.time() - self.started_at, 3),
+            **self.get_stats(),
+            **(extra or {}),
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+    def render_prometheus(self) -> str:
+        """Render every histogram and counter in the Prometheus text exposition format"""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent per operation of each scraper stage",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {histogram.sum:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+        lines += [f"# HELP {p}_stage_bytes_total Bytes handled by each scraper stage",
+                  f"# TYPE {p}_stage_bytes_total counter"]
+        lines += [f'{p}_stage_bytes_total{{stage="{name}"}} {histogram.bytes}'
+                  for name, histogram in sorted(self.histograms.items())]
+        lines += [f"# HELP {p}_stage_errors_total Failed operations of each scraper stage",
+                  f"# TYPE {p}_stage_errors_total counter"]
+        lines += [f'{p}_stage_errors_total{{stage="{name}"}} {histogram.errors}'
+                  for name, histogram in sorted(self.histograms.items())]
+        for name, value in sorted(self.counters.items()):
+            lines += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus text file atomically so a scraper never reads half of it"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+class LogSampler:
+    """Token bucket for high-volume log lines such as one line per URL.
+
+    allow() is true for at most `rate` messages per second (with bursts up to
+    `burst`); the rest are counted in `suppressed` so the total can be logged
+    at the end of a run instead.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 20):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            # Rate 0 disables sampling: every message is logged
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
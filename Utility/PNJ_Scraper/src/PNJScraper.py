@@ -1,28 +1,216 @@
 import asyncio
+import collections
+import hashlib
 import json
+import multiprocessing
 import os
 import re
+import time
 from datetime import datetime
 import random
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup
 from zns_logging import ZnsLogger
 
+from AdaptiveLimiter import AdaptiveLimiter
+from CrawlPipeline import CrawlPipeline
+from CrawlState import CrawlState
+from HttpSessionPool import HttpSessionPool
+from ImageDownloader import ImageDownloader
+from Metrics import LogSampler, Metrics
+from ResponseCache import ResponseCache
+from PageExtractor import PageExtractor, SoupExtractor, create_extractor
+from PayloadArchive import PayloadArchive, encode_payload, read_payloads
+from PostgresLoader import PostgresLoader
+from Records import CategoryRecord, FeatureRecord, ImageRecord, ProductRecord, VariantRecord
+from RetryPolicy import FetchError, RetryPolicy, parse_retry_after
+from SqlWriter import CopyWriter, DoBlockRenderer, SqlScriptWriter, create_sql_writer
+
+# Next.js build id embedded in every page's __NEXT_DATA__
+BUILD_ID = re.compile(rb'"buildId"\s*:\s*"([^"]+)"')
+
+# Data route failures in a row (with a freshly discovered build id) before falling back to HTML for good
+MAX_DATA_ROUTE_FAILURES = 3
+
+
+# Per-process scraper used by the parse workers of the process pool
+_worker_scraper: Optional["PNJScraper"] = None
+
+
+def _init_parse_worker(item_type: str, extractor_backend: str, archive_payloads: bool):
+    """ProcessPoolExecutor initializer: build one extraction-only scraper per worker"""
+    global _worker_scraper
+    _worker_scraper = PNJScraper(item_type, extractor_backend=extractor_backend, collect_metrics=False,
+                                 archive_payloads=archive_payloads)
+    _worker_scraper.logger.setLevel("WARNING")
+
+
+def _parse_page_in_worker(body: bytes, is_data_route: bool) -> Optional[Dict[str, Any]]:
+    """Run the CPU-bound page -> records step inside a pool worker"""
+    if is_data_route:
+        return _worker_scraper.extract_data_route_records(body)
+    return _worker_scraper.extract_page_records(body)
+
+
+def _replay_chunk_in_worker(segment_path: str, spans: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """Extract the records of one chunk of archived payloads inside a pool worker"""
+    return _worker_scraper.replay_chunk(segment_path, spans)
+
 
 class PNJScraper:
-    def __init__(self, item_type: str, max_concurrent_requests: int = 10):
-        self.base_url = f"https://www.pnj.com.vn/{item_type}"
+    def __init__(self, item_type: str, max_concurrent_requests: int = 10,
+                 max_connections_per_host: Optional[int] = None, request_timeout: float = 60.0,
+                 discovery_workers: int = 2, detail_workers: Optional[int] = None,
+                 extraction_workers: int = 1, queue_size: int = 100,
+                 extractor_backend: str = "scan", process_workers: int = 0,
+                 sql_chunk_rows: int = 500, sql_max_file_bytes: int = 0, sql_max_file_rows: int = 0,
+                 output_format: str = "do-block", use_cache: bool = True, cache_dir: Optional[str] = None,
+                 cache_ttl: float = 0, cache_max_bytes: int = 1 << 30,
+                 use_state: bool = True, resume: bool = True, incremental: bool = True,
+                 download_images: bool = False, image_workers: int = 8, thumbnail_size: int = 0,
+                 max_concurrency: Optional[int] = None, max_retries: int = 4, backoff_base: float = 0.5,
+                 max_backoff: float = 30.0, max_retry_after: Optional[float] = None, base_url: Optional[str] = None,
+                 collect_metrics: bool = True, prometheus_file: Optional[str] = None, url_log_rate: float = 5.0,
+                 database_url: Optional[str] = None, db_batch_rows: int = 2000, db_writers: int = 2,
+                 archive_payloads: bool = True, archive_dir: Optional[str] = None, use_data_route: bool = False):
+        # base_url can point the scraper at a mirror or a local stand-in (see benchmark/FakePNJServer.py)
+        self.base_url = f"{(base_url or 'https://www.pnj.com.vn').rstrip('/')}/{item_type}"
         self.item_type = item_type
         self.logger = ZnsLogger(__name__, "DEBUG")
-        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+        # Per-stage timings and byte counts, written to data/<item_type>/metrics_<timestamp>.json after a run
+        # (and to prometheus_file if set); per-URL log lines are capped at url_log_rate per second (0 = all)
+        self.metrics = Metrics(collect_metrics)
+        self.prometheus_file = prometheus_file
+        self.url_log = LogSampler(url_log_rate)
+
+        # Adaptive concurrency: starts at max_concurrent_requests and moves between 1 and max_concurrency.
+        # Pages come from one host, so slots above its connection limit would only queue in the connector (and
+        # count as latency): the per-host limit follows max_concurrency, or caps it when set explicitly
+        max_concurrency = max_concurrency or max_concurrent_requests * 4
+        if max_connections_per_host is None:
+            max_connections_per_host = max_concurrency
+        max_concurrency = min(max_concurrency, max_connections_per_host)
+        max_concurrent_requests = min(max_concurrent_requests, max_concurrency)
+        self.limiter = AdaptiveLimiter(max_concurrent_requests, max_limit=max_concurrency)
+        # Retry-After waits are honoured in full (max_retry_after caps one wait) and not counted as retries
+        self.retry = RetryPolicy(self.limiter, max_retries=max_retries, backoff_base=backoff_base,
+                                 max_backoff=max_backoff, max_retry_after=max_retry_after, logger=self.logger,
+                                 metrics=self.metrics)
+        self.dropped_urls: Dict[str, str] = {}
+
+        self.http = HttpSessionPool(
+            max_connections=max(max_concurrency, max_connections_per_host),
+            max_connections_per_host=max_connections_per_host,
+            total_timeout=request_timeout,
+        )
+
+        # Pipeline sizing: workers per stage and capacity of the queues between them
+        self.discovery_workers = discovery_workers
+        self.detail_workers = detail_workers or max_concurrent_requests
+        self.extraction_workers = max(extraction_workers, process_workers)
+        self.queue_size = queue_size
+
+        # Optional process pool for HTML parsing and record extraction (0 = run on the event loop)
+        self.extractor_backend = extractor_backend
+        self.process_workers = process_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        # Streaming SQL output: format ('do-block', 'upsert' or 'copy'), rows per committed chunk
+        # and optional file roll-over thresholds
+        self.output_format = output_format
+        self.sql_chunk_rows = sql_chunk_rows
+        self.sql_max_file_bytes = sql_max_file_bytes
+        self.sql_max_file_rows = sql_max_file_rows
+
+        # HTML extraction backend; BeautifulSoup stays as the fallback for odd pages
+        self.extractor: PageExtractor = create_extractor(extractor_backend)
+        self.fallback_extractor: Optional[PageExtractor] = (
+            None if isinstance(self.extractor, SoupExtractor) else SoupExtractor()
+        )
+
+        # Persistent response cache; ttl 0 revalidates every entry with a conditional GET
+        self.cache: Optional[ResponseCache] = (
+            ResponseCache(cache_dir or f"data/{item_type}/cache", ttl=cache_ttl, max_bytes=cache_max_bytes)
+            if use_cache else None
+        )
+
+        # Crawl state: resume interrupted crawls and emit SQL only for new or changed products
+        self.state: Optional[CrawlState] = CrawlState(f"data/{item_type}/state.sqlite3") if use_state else None
+        self.resume = resume
+        self.incremental = incremental
+
+        # Image pipeline with its own concurrency budget, fed while products stream through
+        self.download_images = download_images
+        self.image_downloader = ImageDownloader(
+            self.http, f"data/{item_type}/images", workers=image_workers, thumbnail_size=thumbnail_size,
+            retry=self.retry, logger=self.logger, metrics=self.metrics,
+        )
+
+        # Optional direct load into PostgreSQL, alongside the SQL script, while the crawl runs
+        self.loader: Optional[PostgresLoader] = (
+            PostgresLoader(database_url, batch_rows=db_batch_rows, writers=db_writers,
+                           on_batch_failed=self.forget_unloaded_products, logger=self.logger, metrics=self.metrics)
+            if database_url else None
+        )
+
+        # Append-only archive of raw __NEXT_DATA__ payloads, so extraction can be replayed without the network
+        self.archive: Optional[PayloadArchive] = (
+            PayloadArchive(archive_dir or f"data/{item_type}/archive") if archive_payloads else None
+        )
+
+        # Next.js data route: fetch /_next/data/<buildId>/<path>.json instead of the product HTML; the build id
+        # is read from the first HTML page and re-read after a 404, when a deploy has rotated it
+        self.use_data_route = use_data_route
+        self.build_id: Optional[str] = None
+        self.data_route_failures = 0
+        self.data_route_pages = 0
+        self.html_fallbacks = 0
 
         # Create directories for output
         os.makedirs(f"data/{item_type}/json", exist_ok=True)
         os.makedirs(f"data/{item_type}/images", exist_ok=True)
         os.makedirs(f"data/{item_type}/sql", exist_ok=True)
 
+    async def __aenter__(self) -> "PNJScraper":
+        await self.http.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Release the shared HTTP session, its pooled connections, the parse pool and the cache index"""
+        await self.http.close()
+        # run() drains the downloads and loads itself; anything still queued here is being abandoned.
+        # The loader goes first: a batch failing meanwhile still reaches the crawl state
+        if self.loader is not None:
+            await self.loader.close(drain=False)
+        await self.image_downloader.close(drain=False)
+        if self.cache is not None:
+            self.cache.close()
+        if self.state is not None:
+            self.state.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Start the parse process pool on first use, if one is configured"""
+        if self.process_workers > 0 and self.executor is None:
+            # Started mid-crawl, once to_thread and resolver threads exist: forking then can deadlock, so spawn
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_parse_worker,
+                initargs=(self.item_type, self.extractor_backend, self.archive is not None),
+            )
+        return self.executor
+
     def determine_material(self, product_name: str) -> str:
         """Determine material based on product name or randomly if not found"""
         product_name = product_name.lower()
@@ -78,357 +266,678 @@ class PNJScraper:
         """Generate a random gender (0=female, 1=male, 2=unisex)"""
         return random.choice([0, 1, 2])
 
-    async def fetch(self, url: str, return_bytes: bool = False):
+    async def fetch(self, url: str, return_bytes: bool = False, request_class: str = "page"):
         """Fetch HTML content or binary content (for images) asynchronously"""
-        async with self.semaphore:
-            async with ClientSession() as session:
-                async with session.get(url) as response:
-                    return await response.read() if return_bytes else await response.text()
+        with self.metrics.timer("fetch") as timer:
+            result = await self._fetch(url, return_bytes, request_class)
+            timer.bytes = len(result)
+        return result
+
+    async def _fetch(self, url: str, return_bytes: bool, request_class: str):
+        """fetch() without instrumentation: cache lookup, then GET with retries"""
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            body = await self.cache.read(entry)
+            if body is not None:
+                return body if return_bytes else body.decode(entry.encoding, errors="replace")
+
+        session = await self.http.open()
+
+        async def attempt():
+            nonlocal entry
+            async with session.get(url, headers=entry.validators() if entry else None) as response:
+                if response.status == 304 and entry is not None:
+                    body = await self.cache.read(entry, revalidated=True)
+                    if body is not None:
+                        return body if return_bytes else body.decode(entry.encoding, errors="replace")
+                    # Cached body vanished: fetch it again without validators
+                    entry = None
+                elif response.status != 200:
+                    raise FetchError(url, response.status, parse_retry_after(response.headers))
+                else:
+                    return await self._read_response(url, response, return_bytes)
+            return await attempt()
+
+        # Conditional GETs mostly come back as small 304s: they get their own latency baseline
+        return await self.retry.run(url, attempt, f"{request_class}_conditional" if entry else request_class)
+
+    async def _read_response(self, url: str, response, return_bytes: bool):
+        """Read a full response body and store it in the cache if it is a 200"""
+        body = await response.read()
+        encoding = response.charset or "utf-8"
+        if self.cache is not None and response.status == 200:
+            await self.cache.store(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                                   encoding)
+        return body if return_bytes else body.decode(encoding, errors="replace")
+
+    def parse_product_links(self, html: Union[str, bytes]) -> Optional[List[str]]:
+        """Extract listing links with the configured backend, falling back to BeautifulSoup"""
+        with self.metrics.timer("parse_listing", len(html)):
+            links = self.extractor.extract_product_links(html)
+            if links is None and self.fallback_extractor is not None:
+                links = self.fallback_extractor.extract_product_links(html)
+        return links
+
+    def find_next_data(self, extractor: PageExtractor, html: Union[str, bytes]) -> Optional[Union[str, bytes]]:
+        """Locate the raw __NEXT_DATA__ JSON in a product page (HTML parsing)"""
+        with self.metrics.timer("parse", len(html)):
+            return extractor.find_next_data(html)
+
+    def decode_next_data(self, text: Union[str, bytes]) -> Dict[str, Any]:
+        """Decode the raw __NEXT_DATA__ JSON"""
+        with self.metrics.timer("json_decode", len(text)):
+            return json.loads(text)
+
+    def parse_next_data(self, html: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+        """Extract __NEXT_DATA__ with the configured backend, falling back to BeautifulSoup"""
+        return self.parse_next_data_raw(html)[1]
+
+    def parse_next_data_raw(self, html: Union[str, bytes]) -> Tuple[Optional[Union[str, bytes]], Optional[Dict]]:
+        """Like parse_next_data, but also return the raw JSON text the data was decoded from"""
+        try:
+            text = self.find_next_data(self.extractor, html)
+            data = self.decode_next_data(text) if text else None
+        except ValueError as e:
+            self.logger.debug(f"{self.extractor.name} backend could not decode __NEXT_DATA__: {e}")
+            data = None
+        if data is None and self.fallback_extractor is not None:
+            text = self.find_next_data(self.fallback_extractor, html)
+            data = self.decode_next_data(text) if text else None
+        return text, data
 
     async def scrape_product_links(self, page: int) -> list:
         """Extracts product URLs from a given page"""
         url = f"{self.base_url}/page-{page}/"
         self.logger.info(f"Fetching product list from {url}")
         try:
-            html = await self.fetch(url)
-            soup = BeautifulSoup(html, "html.parser")
-            container = soup.find("div", {"id": "ajax_pagination_contents"})
-            return [
-                item.find("a")["href"]
-                for item in container.find_all("div", class_="product-image")
-            ]
+            html = await self.fetch(url, return_bytes=True, request_class="listing")
+            links = self.parse_product_links(html)
+            if links is None:
+                raise ValueError("product list container not found")
+            return [urljoin(url, link) for link in links]
         except Exception as e:
             self.logger.error(f"Error fetching product links from {url}: {e}")
+            self.dropped_urls[url] = repr(e)
             return []
 
-    async def scrape_product_details(self, url: str) -> Optional[Dict[str, Any]]:
-        """Fetch product details from product page and return raw JSON data"""
-        self.logger.info(f"Fetching product details from {url}")
+    def data_route_url(self, url: str, build_id: str) -> str:
+        """Next.js data route URL serving the pageProps of a page URL"""
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/") or "/index"
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{parts.scheme}://{parts.netloc}/_next/data/{build_id}{path}.json{query}"
+
+    def wrap_data_route(self, body: bytes) -> bytes:
+        """Shape a data route response ({"pageProps": ...}) like __NEXT_DATA__ ({"props": {"pageProps": ...}})"""
+        return b'{"props":' + body.strip() + b"}"
+
+    def learn_build_id(self, html: bytes, stale_build_id: Optional[str] = None):
+        """Take the build id of a product page; stale_build_id is the one whose data route 404ed for it"""
+        match = BUILD_ID.search(html)
+        if not match:
+            return
+        build_id = match.group(1).decode("utf-8")
+        if build_id == stale_build_id:
+            # The page exists with the same build, but its data route does not
+            self.data_route_failures += 1
+            if self.data_route_failures >= MAX_DATA_ROUTE_FAILURES:
+                self.use_data_route = False
+                self.logger.warning("The Next.js data route keeps failing, fetching product HTML from now on")
+                return
+        if build_id != self.build_id:
+            self.build_id = build_id
+            self.logger.info(f"Fetching product data through the Next.js data route of build {build_id}")
+
+    async def fetch_data_route(self, url: str, build_id: str) -> Tuple[Optional[bytes], bool]:
+        """Fetch a product's pageProps JSON; returns (None, not_found) when the HTML page must be used instead"""
         try:
-            html = await self.fetch(url)
-            soup = BeautifulSoup(html, "html.parser")
-            script_tag = soup.find("script", {"id": "__NEXT_DATA__"})
-            if not script_tag:
-                return None
-
-            # Parse the JSON data
-            data = json.loads(script_tag.string)
-
-            # Save raw JSON data for reference
-            product_data = data["props"]["pageProps"]["dataServerSide"]
-            product_id = str(product_data["product_id"]).zfill(6)
-
-            # Save the raw JSON
-            # with open(f"data/{self.item_type}/json/{product_id}.json", "w", encoding="utf-8") as f:
-            #     json.dump(data, f, ensure_ascii=False, indent=2)
-
-            return data
+            body = await self.fetch(self.data_route_url(url, build_id), return_bytes=True, request_class="data_route")
+        except Exception as e:
+            # Any failure (an HTTP error, or timeouts and dropped connections out of retries) falls back to HTML;
+            # the URL is only dropped if the HTML page fails too
+            self.html_fallbacks += 1
+            if not isinstance(e, FetchError) or e.status != 404:
+                self.logger.debug(f"Data route of {url} failed ({e!r}), fetching the HTML page")
+                return None, False
+            if self.build_id == build_id:
+                # Most likely a deploy rotated the build id: the next HTML page tells the new one
+                self.build_id = None
+                self.logger.info(f"Data route of build {build_id} returned 404, looking up the build id again")
+            return None, True
+        if b'"dataServerSide"' not in body:
+            # Redirect, notFound or an unexpected shape: leave it to the HTML path
+            self.html_fallbacks += 1
+            return None, False
+        self.data_route_failures = 0
+        self.data_route_pages += 1
+        return body, False
+
+    async def fetch_product_body(self, url: str) -> Tuple[Optional[bytes], bool]:
+        """Fetch a product's data route JSON when available, else its HTML; returns (body, is_data_route)"""
+        if self.url_log.allow():
+            self.logger.info(f"Fetching product details from {url}")
+        stale_build_id = None
+        build_id = self.build_id if self.use_data_route else None
+        if build_id is not None:
+            body, not_found = await self.fetch_data_route(url, build_id)
+            if body is not None:
+                return body, True
+            stale_build_id = build_id if not_found else None
 
+        try:
+            html = await self.fetch(url, return_bytes=True, request_class="product")
         except Exception as e:
             self.logger.error(f"Error fetching product data from {url}: {e}")
+            self.dropped_urls[url] = repr(e)
+            return None, False
+        if self.use_data_route:
+            self.learn_build_id(html, stale_build_id)
+        return html, False
+
+    async def scrape_product_details(self, url: str) -> Optional[Dict[str, Any]]:
+        """Fetch product details from product page and return raw JSON data"""
+        body, is_data_route = await self.fetch_product_body(url)
+        if body is None:
+            return None
+        try:
+            if is_data_route:
+                return self.decode_next_data(self.wrap_data_route(body))
+            return self.parse_next_data(body)
+        except Exception as e:
+            self.logger.error(f"Error parsing product data from {url}: {e}")
+            self.dropped_urls[url] = repr(e)
             return None
 
-    def sanitize_text(self, text: str) -> str:
-        """Clean text for SQL insertion"""
-        if not text:
-            return ""
-        # Replace single quotes with escaped single quotes
-        return text.replace("'", "''")
+    def build_categories(self, payload: Dict) -> List[CategoryRecord]:
+        """Category rows of one dataServerSide payload"""
+        return [
+            CategoryRecord(category["category_id"], category["category"] or "", category["seo_name_url"])
+            for category in payload["category_seo"]
+        ]
+
+    def build_product(self, payload: Dict) -> ProductRecord:
+        """Product row of one dataServerSide payload"""
+        product_name = payload["product"] or ""
+
+        # Determine material based on name or random
+        material = self.determine_material(product_name)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        return ProductRecord(
+            id=payload["product_id"],
+            name=product_name,
+            code=payload["product_code"],
+            description=payload.get("full_description") or "",
+            price=payload["price"],
+            status="ACTIVE" if payload.get("status") == "A" else "INACTIVE",
+            quantity=payload.get("amount", 0),
+            category_id=payload["category_seo"][0]["category_id"],
+            material=material,
+            gold_karat=self.generate_gold_karat(material),
+            color=self.generate_color(material),
+            brand=self.generate_brand(),
+            gender=self.generate_gender(),
+            created_at=now,
+            updated_at=now,
+        )
+
+    def build_images(self, payload: Dict) -> List[ImageRecord]:
+        """Image rows of one dataServerSide payload; the first image is primary"""
+        product_id = payload["product_id"]
+        return [
+            ImageRecord(product_id, img_url, i == 0, i + 1)
+            for i, img_url in enumerate(payload["images"])
+        ]
+
+    def build_features(self, payload: Dict) -> List[FeatureRecord]:
+        """Feature/attribute rows of one dataServerSide payload"""
+        product_id = payload["product_id"]
+        return [
+            FeatureRecord(product_id, feature["feature"] or "", feature["text"] or "")
+            for feature in payload["features"]
+        ]
+
+    def build_variants(self, payload: Dict) -> List[VariantRecord]:
+        """Size variant rows of one dataServerSide payload"""
+        product_id = payload["product_id"]
+        quantity = payload.get("amount", 0)
+        return [
+            VariantRecord(product_id, "SIZE", size, price_info["price"], quantity)
+            for size, price_info in payload["size_modifier_prices"].items()
+        ]
 
     def extract_category_data(self, data: Dict) -> List[Dict]:
-        """Extract category information from product data"""
-        categories = []
+        """Extract category information from product data, as raw text (the SQL renderers do the escaping)"""
         try:
-            for category in data["props"]["pageProps"]["dataServerSide"]["category_seo"]:
-                categories.append({
-                    "id": category["category_id"],
-                    "name": self.sanitize_text(category["category"]),
-                    "url": category["seo_name_url"],
-                })
+            return [cat.as_dict() for cat in self.build_categories(data["props"]["pageProps"]["dataServerSide"])]
         except (KeyError, TypeError):
             self.logger.warning("Failed to extract category data")
-        return categories
+            return []
 
     def extract_product_data(self, data: Dict) -> Dict:
-        """Extract product information from product data"""
-        product = {}
+        """Extract product information from product data, as raw text (the SQL renderers do the escaping)"""
         try:
-            product_data = data["props"]["pageProps"]["dataServerSide"]
-            product_name = self.sanitize_text(product_data["product"])
-
-            # Determine material based on name or random
-            material = self.determine_material(product_name)
-
-            product = {
-                "id": product_data["product_id"],
-                "name": product_name,
-                "code": product_data["product_code"],
-                "description": self.sanitize_text(product_data.get("full_description", "")),
-                "price": product_data["price"],
-                "status": "ACTIVE" if product_data.get("status") == "A" else "INACTIVE",
-                "quantity": product_data.get("amount", 0),
-                "category_id": data["props"]["pageProps"]["dataServerSide"]["category_seo"][0]["category_id"],
-                "material": material,
-                "gold_karat": self.generate_gold_karat(material),
-                "color": self.generate_color(material),
-                "brand": self.generate_brand(),
-                "gender": self.generate_gender(),
-                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
+            return self.build_product(data["props"]["pageProps"]["dataServerSide"]).as_dict()
         except (KeyError, TypeError, IndexError) as e:
             self.logger.warning(f"Failed to extract product data: {e}")
-        return product
+            return {}
 
     def extract_product_images(self, data: Dict) -> List[Dict]:
         """Extract product images from product data"""
-        images = []
         try:
-            product_id = data["props"]["pageProps"]["dataServerSide"]["product_id"]
-            img_list = data["props"]["pageProps"]["dataServerSide"]["images"]
-
-            for i, img_url in enumerate(img_list):
-                images.append({
-                    "product_id": product_id,
-                    "image_url": img_url,
-                    "is_primary": i == 0,  # First image is primary
-                    "sort_order": i + 1,
-                })
+            return [img.as_dict() for img in self.build_images(data["props"]["pageProps"]["dataServerSide"])]
         except (KeyError, TypeError):
             self.logger.warning("Failed to extract image data")
-        return images
+            return []
 
     def extract_product_features(self, data: Dict) -> List[Dict]:
-        """Extract product features/attributes from product data"""
-        features = []
+        """Extract product features/attributes from product data, as raw text (the SQL renderers do the escaping)"""
         try:
-            product_id = data["props"]["pageProps"]["dataServerSide"]["product_id"]
-            feature_list = data["props"]["pageProps"]["dataServerSide"]["features"]
-
-            for feature in feature_list:
-                features.append({
-                    "product_id": product_id,
-                    "name": self.sanitize_text(feature["feature"]),
-                    "value": self.sanitize_text(feature["text"]),
-                })
+            return [feature.as_dict() for feature in self.build_features(data["props"]["pageProps"]["dataServerSide"])]
         except (KeyError, TypeError):
             self.logger.warning("Failed to extract feature data")
-        return features
+            return []
 
     def extract_product_variants(self, data: Dict) -> List[Dict]:
         """Extract product variants (sizes, colors) from product data"""
-        variants = []
         try:
-            product_id = data["props"]["pageProps"]["dataServerSide"]["product_id"]
-            size_prices = data["props"]["pageProps"]["dataServerSide"]["size_modifier_prices"]
-
-            for size, price_info in size_prices.items():
-                variants.append({
-                    "product_id": product_id,
-                    "variant_type": "SIZE",
-                    "variant_value": size,
-                    "price": price_info["price"],
-                    "quantity": data["props"]["pageProps"]["dataServerSide"].get("amount", 0),
-                })
+            return [variant.as_dict() for variant in self.build_variants(data["props"]["pageProps"]["dataServerSide"])]
         except (KeyError, TypeError):
             self.logger.warning("Failed to extract variant data")
-        return variants
+            return []
 
     def generate_sql_script(self, products: List[Dict], categories: List[Dict],
                             images: List[Dict], features: List[Dict], variants: List[Dict]) -> str:
         """Generate SQL script for PostgreSQL from extracted data"""
-        sql = "-- PNJ Data Import Script\n"
-        sql += f"-- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-
-        # Begin transaction
-        sql += "BEGIN;\n\n"
-
-        # Create constraints if they don't exist
-        sql += "-- Add necessary constraints for ON CONFLICT clauses\n"
-        sql += "DO $$ BEGIN\n"
-        sql += "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'categories_id_key') THEN\n"
-        sql += "        ALTER TABLE categories ADD CONSTRAINT categories_id_key UNIQUE (id);\n"
-        sql += "    END IF;\n"
-        sql += "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'products_id_key') THEN\n"
-        sql += "        ALTER TABLE products ADD CONSTRAINT products_id_key UNIQUE (id);\n"
-        sql += "    END IF;\n"
-        sql += "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_images_product_id_image_url_key') THEN\n"
-        sql += "        ALTER TABLE product_images ADD CONSTRAINT product_images_product_id_image_url_key UNIQUE (product_id, image_url);\n"
-        sql += "    END IF;\n"
-        sql += "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_features_product_id_name_key') THEN\n"
-        sql += "        ALTER TABLE product_features ADD CONSTRAINT product_features_product_id_name_key UNIQUE (product_id, name);\n"
-        sql += "    END IF;\n"
-        sql += "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_variants_product_id_variant_type_variant_value_key') THEN\n"
-        sql += "        ALTER TABLE product_variants ADD CONSTRAINT product_variants_product_id_variant_type_variant_value_key UNIQUE (product_id, variant_type, variant_value);\n"
-        sql += "    END IF;\n"
-        sql += "EXCEPTION\n"
-        sql += "    WHEN others THEN\n"
-        sql += "    RAISE NOTICE 'Error adding constraints: %', SQLERRM;\n"
-        sql += "END $$;\n\n"
-
-        # Insert categories
-        sql += "-- Categories Table\n"
-        if categories:
-            # Get unique categories by ID
-            unique_categories = {}
-            for cat in categories:
-                unique_categories[cat["id"]] = cat
-
-            for cat in unique_categories.values():
-                # Version without ON CONFLICT
-                sql += f"DO $$ BEGIN\n"
-                sql += f"    IF NOT EXISTS (SELECT 1 FROM categories WHERE id = {cat['id']}) THEN\n"
-                sql += f"        INSERT INTO categories (id, name, url) VALUES ({cat['id']}, '{cat['name']}', '{cat['url']}');\n"
-                sql += f"    ELSE\n"
-                sql += f"        UPDATE categories SET name = '{cat['name']}', url = '{cat['url']}' WHERE id = {cat['id']};\n"
-                sql += f"    END IF;\n"
-                sql += f"END $$;\n"
-
-        # Insert products
-        sql += "\n-- Products Table\n"
-        for product in products:
-            # Handle NULL values properly
-            gold_karat = "NULL" if product.get('gold_karat') is None else product['gold_karat']
-
-            sql += f"DO $$ BEGIN\n"
-            sql += f"    IF NOT EXISTS (SELECT 1 FROM products WHERE id = {product['id']}) THEN\n"
-            sql += f"        INSERT INTO products (id, name, code, description, price, status, quantity, category_id, material, gold_karat, color, brand, gender, created_at, updated_at) VALUES \n"
-            sql += f"        ({product['id']}, '{product['name']}', '{product['code']}', '{product['description']}', {product['price']}, '{product['status']}', {product['quantity']}, {product['category_id']}, '{product['material']}', {gold_karat}, '{product['color']}', '{product['brand']}', {product['gender']}, '{product['created_at']}', '{product['updated_at']}');\n"
-            sql += f"    ELSE\n"
-            sql += f"        UPDATE products SET name = '{product['name']}', price = {product['price']}, status = '{product['status']}', quantity = {product['quantity']}, material = '{product['material']}', gold_karat = {gold_karat}, color = '{product['color']}', brand = '{product['brand']}', gender = {product['gender']}, updated_at = '{product['updated_at']}' WHERE id = {product['id']};\n"
-            sql += f"    END IF;\n"
-            sql += f"END $$;\n"
-
-        # Insert product images
-        sql += "\n-- Product Images Table\n"
-        for img in images:
-            # Version without ON CONFLICT
-            sql += f"DO $$ BEGIN\n"
-            sql += f"    IF NOT EXISTS (SELECT 1 FROM product_images WHERE product_id = {img['product_id']} AND image_url = '{img['image_url']}') THEN\n"
-            sql += f"        INSERT INTO product_images (product_id, image_url, is_primary, sort_order) VALUES \n"
-            sql += f"        ({img['product_id']}, '{img['image_url']}', {str(img['is_primary']).lower()}, {img['sort_order']});\n"
-            sql += f"    END IF;\n"
-            sql += f"END $$;\n"
-
-        # Insert product features
-        sql += "\n-- Product Features Table\n"
-        for feature in features:
-            # Version without ON CONFLICT
-            sql += f"DO $$ BEGIN\n"
-            sql += f"    IF NOT EXISTS (SELECT 1 FROM product_features WHERE product_id = {feature['product_id']} AND name = '{feature['name']}') THEN\n"
-            sql += f"        INSERT INTO product_features (product_id, name, value) VALUES \n"
-            sql += f"        ({feature['product_id']}, '{feature['name']}', '{feature['value']}');\n"
-            sql += f"    ELSE\n"
-            sql += f"        UPDATE product_features SET value = '{feature['value']}' WHERE product_id = {feature['product_id']} AND name = '{feature['name']}';\n"
-            sql += f"    END IF;\n"
-            sql += f"END $$;\n"
-
-        # Insert product variants
-        sql += "\n-- Product Variants Table\n"
-        for variant in variants:
-            # Version without ON CONFLICT
-            sql += f"DO $$ BEGIN\n"
-            sql += f"    IF NOT EXISTS (SELECT 1 FROM product_variants WHERE product_id = {variant['product_id']} AND variant_type = '{variant['variant_type']}' AND variant_value = '{variant['variant_value']}') THEN\n"
-            sql += f"        INSERT INTO product_variants (product_id, variant_type, variant_value, price, quantity) VALUES \n"
-            sql += f"        ({variant['product_id']}, '{variant['variant_type']}', '{variant['variant_value']}', {variant['price']}, {variant['quantity']});\n"
-            sql += f"    ELSE\n"
-            sql += f"        UPDATE product_variants SET price = {variant['price']}, quantity = {variant['quantity']} WHERE product_id = {variant['product_id']} AND variant_type = '{variant['variant_type']}' AND variant_value = '{variant['variant_value']}';\n"
-            sql += f"    END IF;\n"
-            sql += f"END $$;\n"
-
-        # Commit transaction
-        sql += "\nCOMMIT;\n"
-
-        return sql
+        return DoBlockRenderer().render_script({
+            "products": products,
+            "categories": categories,
+            "images": images,
+            "features": features,
+            "variants": variants,
+        })
 
     async def download_image(self, image_url: str, product_id: str, index: int):
-        """Download image and save to disk"""
-        try:
-            image_name = image_url.split("/")[-1]
-            file_name = f"data/{self.item_type}/images/{product_id}_{index}_{image_name}"
-            self.logger.info(f"Downloading {file_name}")
-            image_data = await self.fetch(image_url, return_bytes=True)
-            with open(file_name, "wb") as f:
-                f.write(image_data)
-        except Exception as e:
-            self.logger.error(f"Failed to download image {image_url}: {e}")
-
-    async def run(self, start_page: int = 1, end_page: int = 1):
-        """Orchestrates the scraping process"""
-        self.logger.info(f"Starting PNJ Scraper for {self.item_type} pages {start_page}-{end_page}")
+        """Download image and save to disk (content-addressed, see ImageDownloader)"""
+        self.logger.debug(f"Downloading image {index} of product {product_id}: {image_url}")
+        await self.image_downloader.start()
+        return await self.image_downloader.download(image_url)
 
-        # Step 1: Get all product URLs
-        product_urls = []
-        for page in range(start_page, end_page + 1):
-            urls = await self.scrape_product_links(page)
-            product_urls.extend(urls)
-            self.logger.info(f"Found {len(urls)} products on page {page}")
-
-        self.logger.info(f"Total of {len(product_urls)} products found")
-
-        # Step 2: Get product details
-        all_products_data = []
-        for url in product_urls:
-            data = await self.scrape_product_details(url)
-            if data:
-                all_products_data.append(data)
-
-        # Step 3: Process data and generate SQL
-        products = []
-        categories = []
-        images = []
-        features = []
-        variants = []
-
-        for data in all_products_data:
-            product_data = self.extract_product_data(data)
+    def extract_records(self, data: Dict) -> Optional[Dict[str, Any]]:
+        """Extract the rows of every table from one product page's JSON data in a single pass"""
+        try:
+            payload = data["props"]["pageProps"]["dataServerSide"]
+            with self.metrics.timer("extract.products"):
+                product = self.build_product(payload)
+        except (KeyError, TypeError, IndexError) as e:
             # Only include complete product records
-            if product_data and 'id' in product_data:
-                products.append(product_data)
-                categories.extend(self.extract_category_data(data))
-                images.extend(self.extract_product_images(data))
-                features.extend(self.extract_product_features(data))
-                variants.extend(self.extract_product_variants(data))
-            else:
-                self.logger.warning(f"Skipping incomplete product data")
-                continue
-
-            categories.extend(self.extract_category_data(data))
-            images.extend(self.extract_product_images(data))
-            features.extend(self.extract_product_features(data))
-            variants.extend(self.extract_product_variants(data))
-
-        # Generate SQL script
-        sql_script = self.generate_sql_script(products, categories, images, features, variants)
+            self.logger.warning(f"Skipping incomplete product data: {e}")
+            return None
 
-        # Save SQL script
+        records = {"products": [product]}
+        for table, build in (("categories", self.build_categories), ("images", self.build_images),
+                             ("features", self.build_features), ("variants", self.build_variants)):
+            try:
+                with self.metrics.timer(f"extract.{table}"):
+                    records[table] = build(payload)
+            except (KeyError, TypeError, AttributeError):
+                self.logger.warning(f"Failed to extract {table} of product {product.id}")
+                records[table] = []
+        with self.metrics.timer("extract.content_hash"):
+            records["content_hash"] = self.content_hash(data)
+        return records
+
+    def content_hash(self, data: Dict) -> str:
+        """Stable hash of a product's dataServerSide payload, used to detect changes between crawls"""
+        payload = data["props"]["pageProps"]["dataServerSide"]
+        return hashlib.sha1(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+
+    async def discover_stage(self, page: int) -> List[str]:
+        """Pipeline stage: listing page number -> product URLs"""
+        if self.state is not None and self.state.is_page_done(page):
+            urls = self.state.pending_urls(page)
+            self.logger.info(f"Resuming page {page}: {len(urls)} products left")
+            return urls
+
+        urls = await self.scrape_product_links(page)
+        self.logger.info(f"Found {len(urls)} products on page {page}")
+        if self.state is not None and urls:
+            # Empty pages are not recorded: they may be a failed fetch
+            urls = self.state.record_page(page, urls)
+        return urls
+
+    def extract_page_records(self, html: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+        """Parse a product page and extract the rows of every table (CPU-bound)"""
+        text, data = self.parse_next_data_raw(html)
+        if not data:
+            self.logger.warning("Product page has no __NEXT_DATA__")
+            return None
+        return self.extract_payload_records(text, data)
+
+    def extract_data_route_records(self, body: bytes) -> Optional[Dict[str, Any]]:
+        """Extract the rows of every table from a data route response, with no HTML parsing"""
+        text = self.wrap_data_route(body)
+        return self.extract_payload_records(text, self.decode_next_data(text))
+
+    def extract_payload_records(self, text: Union[str, bytes], data: Dict) -> Optional[Dict[str, Any]]:
+        """Extract the rows of a decoded payload and, if archiving, compress its raw text (CPU-bound)"""
+        records = self.extract_records(data)
+        if records is not None and self.archive is not None:
+            # Compressed here, in the pool worker when there is one; the sink only appends
+            with self.metrics.timer("archive_encode", len(text)):
+                records["archive_frame"] = encode_payload(text)
+        return records
+
+    def replay_chunk(self, segment_path: str, spans: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Extract the rows of a chunk of archived payloads (CPU-bound)"""
+        chunk = []
+        for text in read_payloads(segment_path, spans):
+            records = self.extract_records(self.decode_next_data(text))
+            if records is not None:
+                chunk.append(records)
+        return chunk
+
+    async def detail_stage(self, url: str) -> List[Tuple[str, bytes, bool]]:
+        """Pipeline stage: product URL -> raw product page, or its data route JSON when available"""
+        body, is_data_route = await self.fetch_product_body(url)
+        return [(url, body, is_data_route)] if body else []
+
+    async def extraction_stage(self, page: Tuple[str, bytes, bool]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Pipeline stage: raw product page -> table rows, in the process pool when enabled"""
+        url, body, is_data_route = page
+        executor = self.get_executor()
+        # Pool workers collect no metrics: only the whole step is timed when it runs out of process
+        with self.metrics.timer("extraction", len(body)):
+            if executor is None:
+                records = (self.extract_data_route_records(body) if is_data_route
+                           else self.extract_page_records(body))
+            else:
+                records = await asyncio.get_running_loop().run_in_executor(
+                    executor, _parse_page_in_worker, body, is_data_route
+                )
+        return [(url, records)] if records else []
+
+    def build_pipeline(self, sink) -> CrawlPipeline:
+        """Wire discovery -> detail fetch -> extraction -> sink"""
+        pipeline = CrawlPipeline(self.logger)
+        pipeline.add_stage("discovery", self.discover_stage, self.discovery_workers, self.queue_size)
+        pipeline.add_stage("detail", self.detail_stage, self.detail_workers, self.queue_size)
+        pipeline.add_stage("extraction", self.extraction_stage, self.extraction_workers, self.queue_size)
+        pipeline.add_stage("sink", sink, 1, self.queue_size)
+        return pipeline
+
+    def create_sql_writer(self) -> Union[SqlScriptWriter, CopyWriter]:
+        """Open a streaming SQL writer under data/<item_type>/sql"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        sql_file = f"data/{self.item_type}/sql/{self.item_type}_{timestamp}.sql"
-        with open(sql_file, "w", encoding="utf-8") as f:
-            f.write(sql_script)
-
-        self.logger.info(f"SQL script saved to {sql_file}")
-
-        # Step 4: Download images (optional)
-        download_tasks = []
-        for img_data in images:
-            product_id = str(img_data["product_id"]).zfill(6)
-            # download_tasks.append(self.download_image(img_data["image_url"], product_id, img_data["sort_order"]))
+        return create_sql_writer(
+            self.output_format,
+            f"data/{self.item_type}/sql/{self.item_type}_{timestamp}",
+            chunk_rows=self.sql_chunk_rows,
+            max_file_bytes=self.sql_max_file_bytes,
+            max_file_rows=self.sql_max_file_rows,
+        )
+
+    def flush_sql(self, writer: Union[SqlScriptWriter, CopyWriter]):
+        """Render and write the buffered rows as one committed chunk (runs in a worker thread)"""
+        if self.archive is not None:
+            # Payloads become durable no later than the SQL (and the crawl state) that covers them
+            with self.metrics.timer("archive_flush"):
+                self.archive.flush()
+        with self.metrics.timer("sql_write"):
+            writer.flush()
+
+    def get_data_route_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.use_data_route,
+            "build_id": self.build_id,
+            "pages": self.data_route_pages,
+            "html_fallbacks": self.html_fallbacks,
+        }
+
+    def write_metrics_report(self, pipeline_stats: Dict, row_counts: Dict[str, int], unchanged: int, duplicates: int):
+        """Write the JSON run report and the optional Prometheus text file"""
+        if not self.metrics.enabled:
+            return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_file = f"data/{self.item_type}/metrics_{timestamp}.json"
+        self.metrics.write_report(report_file, {
+            "item_type": self.item_type,
+            "pipeline": pipeline_stats,
+            "rows": row_counts,
+            "unchanged_products": unchanged,
+            "duplicate_products": duplicates,
+            "dropped_urls": len(self.dropped_urls) + len(self.image_downloader.failed_urls),
+            "suppressed_log_lines": self.url_log.suppressed,
+            "http_pool": self.http.get_stats(),
+            "limiter": self.limiter.get_stats(),
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "images": self.image_downloader.get_stats() if self.download_images else None,
+            "database": self.loader.get_stats() if self.loader is not None else None,
+            "archive": self.archive.get_stats() if self.archive is not None else None,
+            "data_route": self.get_data_route_stats(),
+        })
+        self.logger.info(f"Run report saved to {report_file}")
+        if self.prometheus_file:
+            self.metrics.write_prometheus(self.prometheus_file)
+            self.logger.info(f"Prometheus metrics saved to {self.prometheus_file}")
+
+    def report_dropped_urls(self):
+        """Log the URLs that failed for good (not retryable or out of retries) and save them to a TSV file"""
+        dropped = {**self.dropped_urls, **self.image_downloader.failed_urls}
+        if not dropped:
+            self.logger.info("No URLs were dropped")
+            return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_file = f"data/{self.item_type}/dropped_{timestamp}.tsv"
+        with open(report_file, "w", encoding="utf-8") as f:
+            for url, reason in dropped.items():
+                f.write(f"{url}\t{reason}\n")
+        self.logger.warning(f"Dropped {len(dropped)} URLs ({len(self.image_downloader.failed_urls)} images), "
+                            f"see {report_file}")
+
+    def forget_unloaded_products(self, product_ids: List):
+        """Keep products whose rows did not reach the database out of the crawl state, so the next run loads them"""
+        # Only staged: the next commit() persists it, after the SQL flush as usual
+        if self.state is not None and product_ids:
+            self.state.forget_products(product_ids)
 
-        # Run image download in parallel
-        if download_tasks:
-            self.logger.info(f"Downloading {len(download_tasks)} images...")
-            await asyncio.gather(*download_tasks)
+    async def run(self, start_page: int = 1, end_page: int = 1):
+        """Orchestrates the scraping process"""
+        self.logger.info(f"Starting PNJ Scraper for {self.item_type} pages {start_page}-{end_page}")
 
-        self.logger.info(f"Scraping complete! Processed {len(products)} products")
+        if self.state is not None:
+            crawl_id = self.state.begin_crawl(self.item_type, start_page, end_page, self.resume)
+            self.logger.info(f"{'Resuming' if self.state.resumed else 'Starting'} crawl #{crawl_id}")
+
+        unchanged = 0
+        duplicates = 0
+        seen_product_ids = set()
+        writer = self.create_sql_writer()
+
+        async def write_sql(item: Tuple[str, Dict[str, Any]]):
+            nonlocal unchanged, duplicates
+            url, records = item
+            product_id = records["products"][0].id
+
+            # The same product can be listed on several pages (or under several URLs)
+            if product_id in seen_product_ids:
+                duplicates += 1
+                if self.state is not None:
+                    self.state.stage_url_done(url)
+                return
+            seen_product_ids.add(product_id)
+
+            unchanged_payload = (self.state is not None and self.incremental
+                                 and self.state.is_unchanged(product_id, records["content_hash"]))
+            # Archive new and changed payloads, and unchanged ones the archive does not have yet
+            if self.archive is not None and not (unchanged_payload and product_id in self.archive):
+                self.archive.append(product_id, records["archive_frame"])
+
+            if self.state is not None:
+                if unchanged_payload:
+                    # Same payload as the last crawl: nothing to import
+                    unchanged += 1
+                    self.state.stage_url_done(url)
+                    return
+                self.state.stage_product(url, product_id, records["content_hash"])
+
+            # Stream rows into the SQL script; full chunks are written off the event loop
+            if writer.add(records):
+                await asyncio.to_thread(self.flush_sql, writer)
+                if self.state is not None:
+                    self.state.commit()
+
+            # Batches are loaded by the loader tasks; flush() waits while they are behind
+            if self.loader is not None and self.loader.add(records):
+                await self.loader.flush()
+
+            # Step 4: Download images (optional), streamed as products arrive
+            if self.download_images:
+                for img_data in records["images"]:
+                    await self.image_downloader.put(img_data["image_url"])
+
+        # Steps 1-4: discover, fetch, extract, write and download concurrently, page by page
+        try:
+            if self.download_images:
+                await self.image_downloader.start()
+            if self.loader is not None:
+                await self.loader.start()
+            pipeline = self.build_pipeline(write_sql)
+            stats = await pipeline.run(range(start_page, end_page + 1))
+            if self.download_images:
+                self.logger.info("Waiting for image downloads to finish...")
+                await self.image_downloader.close()
+            if self.loader is not None:
+                self.logger.info("Waiting for the database loader to finish...")
+                await self.loader.close()
+        finally:
+            # Also on interruption: commit what was buffered so the script stays valid,
+            # then record the flushed products as done
+            with self.metrics.timer("sql_write"):
+                writer.close()
+            if self.archive is not None:
+                self.archive.flush()
+            if self.state is not None:
+                if self.loader is not None:
+                    # Interrupted before the loader drained: these rows never reach the database
+                    self.forget_unloaded_products(self.loader.pending_products())
+                self.state.commit()
+            self.logger.info(f"SQL script saved to {', '.join(writer.paths)}")
+
+        if self.state is not None:
+            self.state.finish_crawl()
+
+        self.logger.info(f"Total of {stats['discovery']['emitted']} products found")
+        self.logger.info(f"Pipeline stats: {stats}")
+
+        if self.download_images:
+            self.logger.info(f"Image download stats: {self.image_downloader.get_stats()}")
+
+        counts = writer.row_counts
+        self.logger.info(f"Scraping complete! Processed {counts['products']} products "
+                         f"({unchanged} unchanged and {duplicates} duplicates skipped)")
         self.logger.info(
-            f"Generated SQL with {len(categories)} categories, {len(products)} products, {len(images)} images, {len(features)} features, and {len(variants)} variants")
+            f"Generated SQL with {counts['categories']} categories, {counts['products']} products, {counts['images']} images, {counts['features']} features, and {counts['variants']} variants")
+        if self.loader is not None:
+            self.logger.info(f"Database loader stats: {self.loader.get_stats()}")
+        if self.archive is not None:
+            self.logger.info(f"Payload archive stats: {self.archive.get_stats()}")
+        self.logger.info(f"HTTP pool stats: {self.http.get_stats()}")
+        self.logger.info(f"Concurrency limiter stats: {self.limiter.get_stats()}")
+        if self.data_route_pages or self.html_fallbacks:
+            self.logger.info(f"Data route stats: {self.get_data_route_stats()}")
+        self.report_dropped_urls()
+        if self.cache is not None:
+            self.logger.info(f"Response cache stats: {self.cache.get_stats()}")
+        if self.url_log.suppressed:
+            self.logger.info(f"{self.url_log.suppressed} per-URL log lines were suppressed by sampling")
+        self.write_metrics_report(stats, writer.row_counts, unchanged, duplicates)
+        if self.loader is not None:
+            self.loader.check()
+
+    async def replay(self, chunk_size: int = 500):
+        """Re-run extraction and SQL generation over the archived payloads, without the network.
+
+        The latest payload of every archived product is read from the segments
+        through mmap; chunks are extracted in the process pool when
+        process_workers is set, and the rows go to a new SQL script (and to the
+        database when database_url is set) exactly as in run().
+        """
+        if self.archive is None:
+            raise ValueError("Replay needs the payload archive (archive_payloads=True)")
+        chunks = self.archive.plan_replay(chunk_size)
+        self.logger.info(f"Replaying {len(self.archive.load_index())} archived products in {len(chunks)} chunks")
+
+        started = time.perf_counter()
+        products = 0
+        writer = self.create_sql_writer()
+        executor = self.get_executor()
+        loop = asyncio.get_running_loop()
+        # Keep every pool worker busy while the rows of finished chunks are written
+        window = 2 * self.process_workers
+        in_flight = collections.deque()
+
+        async def write_chunk(chunk: List[Dict[str, Any]]):
+            nonlocal products
+            for records in chunk:
+                products += 1
+                if writer.add(records):
+                    await asyncio.to_thread(self.flush_sql, writer)
+                if self.loader is not None and self.loader.add(records):
+                    await self.loader.flush()
+
+        try:
+            if self.loader is not None:
+                await self.loader.start()
+            for segment_path, spans in chunks:
+                if executor is None:
+                    with self.metrics.timer("replay_chunk"):
+                        chunk = self.replay_chunk(segment_path, spans)
+                    await write_chunk(chunk)
+                    continue
+                in_flight.append(loop.run_in_executor(executor, _replay_chunk_in_worker, segment_path, spans))
+                if len(in_flight) >= window:
+                    await write_chunk(await in_flight.popleft())
+            while in_flight:
+                await write_chunk(await in_flight.popleft())
+            if self.loader is not None:
+                await self.loader.close()
+        finally:
+            with self.metrics.timer("sql_write"):
+                writer.close()
+            self.logger.info(f"SQL script saved to {', '.join(writer.paths)}")
+
+        elapsed = time.perf_counter() - started
+        self.logger.info(f"Replayed {products} products in {elapsed:.2f}s ({products / elapsed:.0f} products/s)")
+        if self.loader is not None:
+            self.logger.info(f"Database loader stats: {self.loader.get_stats()}")
+        self.write_metrics_report({"replay": {"products": products, "chunks": len(chunks),
+                                              "seconds": round(elapsed, 3)}},
+                                  writer.row_counts, 0, 0)
+        if self.loader is not None:
+            self.loader.check()
 
 
 if __name__ == "__main__":
     item_type = input("Enter item type (e.g., nhan, day-chuyen, lac): ")
-    start_page = int(input("Enter start page number: ") or "1")
-    end_page = int(input("Enter end page number: ") or "1")
+    replay = input("Replay archived payloads instead of crawling? (y/N): ").strip().lower() == "y"
+    if not replay:
+        start_page = int(input("Enter start page number: ") or "1")
+        end_page = int(input("Enter end page number: ") or "1")
+
+    process_workers = int(input("Enter number of parse processes (0 = none): ") or "0")
+    output_format = input("Enter SQL output format (do-block, upsert, copy): ") or "do-block"
+    database_url = input("Enter PostgreSQL URL to also load into directly (blank = SQL file only): ") or None
+    use_data_route = input("Fetch product data through the Next.js data route? (y/N): ").strip().lower() == "y"
+
+    async def main():
+        async with PNJScraper(item_type, process_workers=process_workers, output_format=output_format,
+                              database_url=database_url, use_data_route=use_data_route) as scraper:
+            if replay:
+                await scraper.replay()
+            else:
+                await scraper.run(start_page, end_page)
 
-    scraper = PNJScraper(item_type)
-    asyncio.run(scraper.run(start_page, end_page))
+    asyncio.run(main())
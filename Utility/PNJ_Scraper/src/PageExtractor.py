@@ -0,0 +1,153 @@
+import html as html_lib
+import json
+import re
+from typing import Dict, List, Any, Optional, Union
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+Markup = Union[str, bytes]
+
+NEXT_DATA_OPEN = re.compile(rb"""<script[^>]*\bid\s*=\s*["']__NEXT_DATA__["'][^>]*>""", re.IGNORECASE)
+SCRIPT_CLOSE = re.compile(rb"</script\s*>", re.IGNORECASE)
+LISTING_CONTAINER = re.compile(rb"""<div[^>]*\bid\s*=\s*["']ajax_pagination_contents["'][^>]*>""", re.IGNORECASE)
+PRODUCT_IMAGE_DIV = re.compile(rb"""<div[^>]*\bclass\s*=\s*["'](?:[^"']*\s)?product-image(?:\s[^"']*)?["'][^>]*>""",
+                               re.IGNORECASE)
+DIV_TAG = re.compile(rb"<(/?)div\b", re.IGNORECASE)
+ANCHOR_HREF = re.compile(rb"""<a\b[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+
+def _to_bytes(markup: Markup) -> bytes:
+    return markup.encode("utf-8") if isinstance(markup, str) else markup
+
+
+class PageExtractor:
+    """Pulls the embedded __NEXT_DATA__ JSON and listing links out of PNJ pages"""
+
+    name = "base"
+
+    def find_next_data(self, markup: Markup) -> Optional[Union[str, bytes]]:
+        """Return the raw __NEXT_DATA__ JSON text, or None if the page has none"""
+        raise NotImplementedError
+
+    def extract_next_data(self, markup: Markup) -> Optional[Dict[str, Any]]:
+        """Return the parsed __NEXT_DATA__ JSON, or None if the page has none"""
+        text = self.find_next_data(markup)
+        return json.loads(text) if text else None
+
+    def extract_product_links(self, markup: Markup) -> Optional[List[str]]:
+        """Return product URLs of a listing page, or None if the listing container is missing"""
+        raise NotImplementedError
+
+
+class ScanExtractor(PageExtractor):
+    """Direct byte scanner: finds the tags by pattern without building a DOM"""
+
+    name = "scan"
+
+    def find_next_data(self, markup: Markup) -> Optional[bytes]:
+        data = _to_bytes(markup)
+        start = NEXT_DATA_OPEN.search(data)
+        if not start:
+            return None
+        end = SCRIPT_CLOSE.search(data, start.end())
+        if not end:
+            return None
+        return data[start.end():end.start()]
+
+    @staticmethod
+    def _container_end(data: bytes, start: int) -> int:
+        """Offset of the </div> closing the div opened just before start (end of data if unclosed)"""
+        depth = 1
+        for tag in DIV_TAG.finditer(data, start):
+            depth += -1 if tag.group(1) else 1
+            if depth == 0:
+                return tag.start()
+        return len(data)
+
+    def extract_product_links(self, markup: Markup) -> Optional[List[str]]:
+        data = _to_bytes(markup)
+        container = LISTING_CONTAINER.search(data)
+        if not container:
+            return None
+
+        end = self._container_end(data, container.end())
+        items = list(PRODUCT_IMAGE_DIV.finditer(data, container.end(), end))
+        links = []
+        for item, next_item in zip(items, items[1:] + [None]):
+            # An item without a link must not borrow the next item's href
+            anchor = ANCHOR_HREF.search(data, item.end(), next_item.start() if next_item else end)
+            if anchor:
+                href = next(group for group in anchor.groups() if group is not None)
+                links.append(html_lib.unescape(href.decode("utf-8")))
+        return links
+
+
+class LxmlExtractor(PageExtractor):
+    """libxml2-backed parser, much faster than html.parser"""
+
+    name = "lxml"
+
+    def __init__(self):
+        if lxml_html is None:
+            raise ImportError("lxml is not installed, use the 'scan' or 'bs4' backend")
+        self.parser = lxml_html.HTMLParser(encoding="utf-8")
+
+    def _parse(self, markup: Markup):
+        return lxml_html.document_fromstring(_to_bytes(markup), parser=self.parser)
+
+    def find_next_data(self, markup: Markup) -> Optional[str]:
+        scripts = self._parse(markup).xpath('//script[@id="__NEXT_DATA__"]')
+        if not scripts or not scripts[0].text:
+            return None
+        return scripts[0].text
+
+    def extract_product_links(self, markup: Markup) -> Optional[List[str]]:
+        containers = self._parse(markup).xpath('//div[@id="ajax_pagination_contents"]')
+        if not containers:
+            return None
+        items = containers[0].xpath(
+            './/div[contains(concat(" ", normalize-space(@class), " "), " product-image ")]')
+        return [item.xpath("(.//a)[1]/@href")[0] for item in items]
+
+
+class SoupExtractor(PageExtractor):
+    """Original BeautifulSoup + html.parser path, kept as the reference fallback"""
+
+    name = "bs4"
+
+    def find_next_data(self, markup: Markup) -> Optional[str]:
+        soup = BeautifulSoup(markup, "html.parser")
+        script_tag = soup.find("script", {"id": "__NEXT_DATA__"})
+        if not script_tag:
+            return None
+        return script_tag.string
+
+    def extract_product_links(self, markup: Markup) -> Optional[List[str]]:
+        soup = BeautifulSoup(markup, "html.parser")
+        container = soup.find("div", {"id": "ajax_pagination_contents"})
+        if not container:
+            return None
+        return [
+            item.find("a")["href"]
+            for item in container.find_all("div", class_="product-image")
+        ]
+
+
+EXTRACTORS = {
+    ScanExtractor.name: ScanExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+    SoupExtractor.name: SoupExtractor,
+}
+
+
+def create_extractor(backend: str) -> PageExtractor:
+    """Instantiate an extraction backend by name ('scan', 'lxml' or 'bs4')"""
+    try:
+        return EXTRACTORS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown extractor backend {backend!r}, expected one of {list(EXTRACTORS)}")
@@ -0,0 +1,154 @@
+import gzip
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# One index entry: product_id, segment number, offset and length of the product's gzip member
+INDEX_ENTRY = struct.Struct("<QIQI")
+
+
+def encode_payload(text: Union[str, bytes]) -> bytes:
+    """Compress one raw __NEXT_DATA__ document into a self-contained gzip member (one JSONL line)"""
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    return gzip.compress(data.strip().replace(b"\n", b" ") + b"\n", compresslevel=6, mtime=0)
+
+
+def read_payloads(segment_path: str, spans: List[Tuple[int, int]]) -> Iterator[bytes]:
+    """Yield the decompressed documents at the given (offset, length) spans of one segment, via mmap"""
+    with open(segment_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for offset, length in spans:
+            yield gzip.decompress(mm[offset:offset + length])
+
+
+class PayloadArchive:
+    """Append-only archive of raw __NEXT_DATA__ payloads.
+
+    Payloads are appended to segment-NNNNN.jsonl.gz files, each one its own
+    gzip member, so a segment is a regular gzipped JSONL file (zcat works) and
+    any payload can also be read alone from its offset. index.bin holds a
+    fixed-size (product_id, segment, offset, length) entry per payload; the
+    last entry of a product wins. A segment is flushed before its index
+    entries, so a crash can lose a tail of payloads but never index garbage.
+    """
+
+    def __init__(self, archive_dir: str, max_segment_bytes: int = 256 * 1024 * 1024):
+        self.archive_dir = archive_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.index_path = os.path.join(archive_dir, "index.bin")
+        self.entries: Optional[Dict[int, Tuple[int, int, int]]] = None
+        self.segment = 0
+        self.segment_file = None
+        self.segment_bytes = 0
+        self.index_file = None
+        self.pending_index = bytearray()
+
+        self.appended = 0
+        self.bytes_appended = 0
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.archive_dir, f"segment-{segment:05d}.jsonl.gz")
+
+    def load_index(self) -> Dict[int, Tuple[int, int, int]]:
+        """Read index.bin (once) into product_id -> (segment, offset, length)"""
+        if self.entries is not None:
+            return self.entries
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for product_id, segment, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+                self.entries[product_id] = (segment, offset, length)
+                self.segment = max(self.segment, segment)
+        return self.entries
+
+    def open(self):
+        """Open the last segment and the index for appending"""
+        if self.segment_file is not None:
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.load_index()
+        with open(self.index_path, "ab") as f:
+            # Drop a torn entry left by a crash in the middle of a write
+            f.truncate(f.tell() - f.tell() % INDEX_ENTRY.size)
+        self.index_file = open(self.index_path, "ab")
+        self._open_segment(self.segment)
+
+    def _open_segment(self, segment: int):
+        self.segment = segment
+        self.segment_file = open(self.segment_path(segment), "ab")
+        # Cut payloads written after the last index flush so the segment stays one valid gzip stream
+        indexed_end = max((offset + length for seg, offset, length in self.entries.values() if seg == segment),
+                          default=0)
+        if self.segment_file.tell() > indexed_end:
+            self.segment_file.truncate(indexed_end)
+            self.segment_file.seek(indexed_end)
+        self.segment_bytes = indexed_end
+
+    def __contains__(self, product_id) -> bool:
+        return int(product_id) in self.load_index()
+
+    def append(self, product_id, frame: bytes):
+        """Append one payload encoded with encode_payload()"""
+        self.open()
+        if self.segment_bytes and self.segment_bytes + len(frame) > self.max_segment_bytes:
+            self.flush()
+            self.segment_file.close()
+            self._open_segment(self.segment + 1)
+        offset = self.segment_bytes
+        self.segment_file.write(frame)
+        self.segment_bytes += len(frame)
+        self.entries[int(product_id)] = (self.segment, offset, len(frame))
+        self.pending_index += INDEX_ENTRY.pack(int(product_id), self.segment, offset, len(frame))
+        self.appended += 1
+        self.bytes_appended += len(frame)
+
+    def flush(self):
+        """Make the appended payloads durable, then their index entries"""
+        if self.segment_file is None:
+            return
+        self.segment_file.flush()
+        os.fsync(self.segment_file.fileno())
+        if self.pending_index:
+            self.index_file.write(self.pending_index)
+            self.index_file.flush()
+            self.pending_index = bytearray()
+
+    def close(self):
+        if self.segment_file is not None:
+            self.flush()
+            self.segment_file.close()
+            self.index_file.close()
+            self.segment_file = None
+            self.index_file = None
+
+    def get(self, product_id) -> Optional[bytes]:
+        """Read one archived payload, or None if the product is not archived"""
+        entry = self.load_index().get(int(product_id))
+        if entry is None:
+            return None
+        segment, offset, length = entry
+        if self.segment_file is not None and segment == self.segment:
+            self.flush()
+        return next(read_payloads(self.segment_path(segment), [(offset, length)]))
+
+    def plan_replay(self, chunk_size: int = 500) -> List[Tuple[str, List[Tuple[int, int]]]]:
+        """Split the latest payload of every product into (segment path, spans) chunks in file order"""
+        by_segment: Dict[int, List[Tuple[int, int]]] = {}
+        for segment, offset, length in self.load_index().values():
+            by_segment.setdefault(segment, []).append((offset, length))
+        chunks = []
+        for segment in sorted(by_segment):
+            spans = sorted(by_segment[segment])
+            path = self.segment_path(segment)
+            chunks.extend((path, spans[i:i + chunk_size]) for i in range(0, len(spans), chunk_size))
+        return chunks
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "products": len(self.load_index()),
+            "appended": self.appended,
+            "bytes_appended": self.bytes_appended,
+            "segments": self.segment + 1,
+        }
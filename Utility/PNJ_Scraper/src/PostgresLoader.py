@@ -0,0 +1,210 @@
+import asyncio
+import io
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from Metrics import Metrics
+from SqlWriter import SQL_CONSTRAINTS, TABLE_SPECS, TABLES, copy_field
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+_STOP = object()
+
+
+class PostgresLoader:
+    """Loads extracted rows straight into PostgreSQL while the crawl runs.
+
+    Rows are buffered like the SQL writers do (add() returns True once
+    batch_rows are waiting, flush() hands the batch over). Batches go through a
+    bounded queue to `writers` loader tasks, each using one pooled connection,
+    so a slow database blocks flush() and backpressure reaches the crawl. Every
+    batch is one transaction: in FK order (categories, products, then images,
+    features and variants), each table is COPYed into a temporary staging table
+    and merged with INSERT ... SELECT DISTINCT ON ... ON CONFLICT, the same
+    statements as the CopyWriter load script.
+
+    A batch that still fails after its retries is not loaded at all: the ids
+    of its products go to on_batch_failed (so the caller can stop treating
+    them as done), and check() turns any such failure into an error once the
+    run is over.
+    """
+
+    def __init__(self, dsn: str, batch_rows: int = 2000, writers: int = 2, queue_batches: int = 4,
+                 max_retries: int = 3, on_batch_failed: Optional[Callable[[List], None]] = None,
+                 logger: Optional[logging.Logger] = None, metrics: Optional[Metrics] = None):
+        if asyncpg is None:
+            raise ImportError("asyncpg is not installed, install the 'postgres' extra to load into PostgreSQL")
+        self.dsn = dsn
+        self.batch_rows = batch_rows
+        self.writers = writers
+        self.queue_batches = queue_batches
+        self.max_retries = max_retries
+        self.on_batch_failed = on_batch_failed
+        self.logger = logger or logging.getLogger(__name__)
+        self.metrics = metrics or Metrics(enabled=False)
+
+        self.pool = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks = []
+
+        self.buffer: Dict[str, List[Dict]] = {table: [] for table in TABLES}
+        self.buffered_rows = 0
+        self.buffered_products = []
+        # Products of the batches handed to the loader tasks but not loaded (or failed) yet
+        self.unloaded_products: Dict[int, List] = {}
+        # Categories already committed need not be sent again; until then every batch carries its own
+        # so it never depends on another (possibly uncommitted) transaction for its foreign keys
+        self.committed_category_ids = set()
+
+        self.row_counts: Dict[str, int] = {table: 0 for table in TABLES}
+        self.batches = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        self.load_seconds = 0.0
+
+    async def start(self):
+        """Open the connection pool, make sure the upsert constraints exist and start the loader tasks"""
+        if self.queue is not None:
+            return
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.writers)
+        await self.pool.execute(SQL_CONSTRAINTS)
+        self.queue = asyncio.Queue(maxsize=self.queue_batches)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.writers)]
+
+    def add(self, records: Dict[str, List[Dict]]) -> bool:
+        """Buffer one product's rows; returns True when a batch is ready to flush"""
+        for table in TABLES:
+            rows = records.get(table, ())
+            if table == "categories":
+                rows = [cat for cat in rows if cat["id"] not in self.committed_category_ids]
+            self.buffer[table].extend(rows)
+            self.buffered_rows += len(rows)
+        self.buffered_products.extend(product["id"] for product in records.get("products", ()))
+        return self.buffered_rows >= self.batch_rows
+
+    async def flush(self):
+        """Queue the buffered rows as one batch, waiting while the loaders are behind"""
+        if not self.buffered_rows:
+            return
+        batch, rows, products = self.buffer, self.buffered_rows, self.buffered_products
+        self.buffer = {table: [] for table in TABLES}
+        self.buffered_rows = 0
+        self.buffered_products = []
+        self.unloaded_products[id(batch)] = products
+        await self.queue.put((batch, rows))
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                await self.queue.put(_STOP)
+                return
+            batch, rows = item
+            try:
+                await self._load_with_retries(batch, rows)
+            except Exception as e:
+                self.failed_batches += 1
+                self.failed_rows += rows
+                self.logger.error(f"Failed to load a batch of {rows} rows into PostgreSQL: {e!r}")
+                products = self.unloaded_products.pop(id(batch))
+                if self.on_batch_failed is not None:
+                    self.on_batch_failed(products)
+            else:
+                self.unloaded_products.pop(id(batch))
+
+    async def _load_with_retries(self, batch: Dict[str, List[Dict]], rows: int):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.metrics.timer("db_load") as timer:
+                    timer.bytes = await self._load(batch)
+                break
+            except (asyncpg.exceptions.DeadlockDetectedError, asyncpg.exceptions.SerializationError) as e:
+                # Concurrent batches upserting the same categories can collide; the transaction is safe to replay
+                if attempt == self.max_retries:
+                    raise
+                self.logger.debug(f"Retrying a batch of {rows} rows after {e!r} (attempt {attempt + 1})")
+                await asyncio.sleep(0.1 * 2 ** attempt)
+
+        self.batches += 1
+        for table in TABLES:
+            self.row_counts[table] += len(batch[table])
+        self.committed_category_ids.update(cat["id"] for cat in batch["categories"])
+
+    async def _load(self, batch: Dict[str, List[Dict]]) -> int:
+        """Load one batch in a single transaction; returns the COPY payload size"""
+        started = time.perf_counter()
+        payload_bytes = 0
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                for table in TABLES:
+                    rows = batch[table]
+                    if not rows:
+                        continue
+                    spec = TABLE_SPECS[table]
+                    columns = ", ".join(spec.columns)
+                    key = ", ".join(spec.key)
+                    stage = f"stage_{spec.table}"
+                    data = "".join(
+                        "\t".join(copy_field(row[column]) for column in spec.columns) + "\n" for row in rows
+                    ).encode("utf-8")
+                    payload_bytes += len(data)
+
+                    await connection.execute(
+                        f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {columns} FROM {spec.table} WITH NO DATA"
+                    )
+                    await connection.copy_to_table(stage, source=io.BytesIO(data), columns=list(spec.columns),
+                                                   format="text")
+                    # Sorted by key so concurrent batches take row locks in the same order
+                    await connection.execute(
+                        f"INSERT INTO {spec.table} ({columns}) "
+                        f"SELECT DISTINCT ON ({key}) {columns} FROM {stage} ORDER BY {key} "
+                        f"{spec.conflict_clause()}"
+                    )
+        self.load_seconds += time.perf_counter() - started
+        return payload_bytes
+
+    async def close(self, drain: bool = True):
+        """Load what is left (unless drain is False), stop the loader tasks and close the pool"""
+        if self.queue is not None:
+            if drain:
+                await self.flush()
+                await self.queue.put(_STOP)
+            else:
+                for task in self.tasks:
+                    task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=not drain)
+            self.queue = None
+            self.tasks = []
+        if self.pool is not None:
+            if drain:
+                await self.pool.close()
+            else:
+                self.pool.terminate()
+            self.pool = None
+
+    def pending_products(self) -> List:
+        """Ids of the products whose rows are buffered, queued or being loaded (all of them lost if not drained)"""
+        return self.buffered_products + [product for products in self.unloaded_products.values()
+                                         for product in products]
+
+    def check(self):
+        """Raise if any batch failed to load, so a partial load fails the run instead of passing unnoticed"""
+        if self.failed_batches:
+            raise RuntimeError(f"{self.failed_rows} rows in {self.failed_batches} batches failed to load into "
+                               f"PostgreSQL (see the log)")
+
+    def get_stats(self) -> Dict[str, float]:
+        loaded = sum(self.row_counts.values())
+        return {
+            "batches": self.batches,
+            "rows": loaded,
+            "failed_batches": self.failed_batches,
+            "failed_rows": self.failed_rows,
+            "load_seconds": round(self.load_seconds, 3),
+            "rows_per_sec": round(loaded / self.load_seconds, 1) if self.load_seconds else 0.0,
+            **{f"{table}_rows": count for table, count in self.row_counts.items()},
+        }
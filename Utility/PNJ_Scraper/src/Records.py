@@ -0,0 +1,105 @@
+from typing import Any, Dict, Iterator, Tuple
+
+
+class Record:
+    """Compact slotted row.
+
+    Rows are read like dicts (row["id"], row.get(...), row.items()) so the SQL
+    renderers and writers accept them and plain dicts alike, but they carry no
+    per-instance __dict__ and pickle as a bare tuple of values.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def values(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((key, getattr(self, key)) for key in self.__slots__)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def __reduce__(self):
+        return self.__class__, self.values()
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={value!r}" for key, value in self.items())
+        return f"{self.__class__.__name__}({fields})"
+
+
+class CategoryRecord(Record):
+    __slots__ = ("id", "name", "url")
+
+    def __init__(self, id, name, url):
+        self.id = id
+        self.name = name
+        self.url = url
+
+
+class ProductRecord(Record):
+    __slots__ = ("id", "name", "code", "description", "price", "status", "quantity", "category_id", "material",
+                 "gold_karat", "color", "brand", "gender", "created_at", "updated_at")
+
+    def __init__(self, id, name, code, description, price, status, quantity, category_id, material,
+                 gold_karat, color, brand, gender, created_at, updated_at):
+        self.id = id
+        self.name = name
+        self.code = code
+        self.description = description
+        self.price = price
+        self.status = status
+        self.quantity = quantity
+        self.category_id = category_id
+        self.material = material
+        self.gold_karat = gold_karat
+        self.color = color
+        self.brand = brand
+        self.gender = gender
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+class ImageRecord(Record):
+    __slots__ = ("product_id", "image_url", "is_primary", "sort_order")
+
+    def __init__(self, product_id, image_url, is_primary, sort_order):
+        self.product_id = product_id
+        self.image_url = image_url
+        self.is_primary = is_primary
+        self.sort_order = sort_order
+
+
+class FeatureRecord(Record):
+    __slots__ = ("product_id", "name", "value")
+
+    def __init__(self, product_id, name, value):
+        self.product_id = product_id
+        self.name = name
+        self.value = value
+
+
+class VariantRecord(Record):
+    __slots__ = ("product_id", "variant_type", "variant_value", "price", "quantity")
+
+    def __init__(self, product_id, variant_type, variant_value, price, quantity):
+        self.product_id = product_id
+        self.variant_type = variant_type
+        self.variant_value = variant_value
+        self.price = price
+        self.quantity = quantity
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+
+class CacheEntry:
+    """Metadata of one cached response"""
+
+    __slots__ = ("key", "url", "etag", "last_modified", "encoding", "compressed", "size", "stored_at")
+
+    def __init__(self, key: str, url: str, etag: Optional[str], last_modified: Optional[str],
+                 encoding: str, compressed: bool, size: int, stored_at: float):
+        self.key = key
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+        self.compressed = compressed
+        self.size = size
+        self.stored_at = stored_at
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional GET"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Persistent URL-keyed HTTP response cache.
+
+    Bodies are stored zlib-compressed (unless that does not shrink them, as
+    with images) in content files under cache_dir; a SQLite index keeps the
+    validators and access times. Entries younger than ttl are served without
+    touching the network, older ones are revalidated with a conditional GET.
+    The total stored size is kept under max_bytes by evicting least recently
+    used entries.
+    """
+
+    def __init__(self, cache_dir: str, ttl: float = 0, max_bytes: int = 1 << 30):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.db: Optional[sqlite3.Connection] = None
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+        self.bytes_served = 0
+
+    def open(self):
+        """Open the index on first use (pool workers build a scraper but never fetch)"""
+        if self.db is not None:
+            return
+        os.makedirs(os.path.join(self.cache_dir, "bodies"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.cache_dir, "index.sqlite3"))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "encoding TEXT NOT NULL, compressed INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "bodies", key[:2], key)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Return the cache entry for url, if any"""
+        self.open()
+        key = self.make_key(url)
+        row = self.db.execute(
+            "SELECT url, etag, last_modified, encoding, compressed, size, stored_at FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(key, row[0], row[1], row[2], row[3], bool(row[4]), row[5], row[6])
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.ttl > 0 and time.time() - entry.stored_at < self.ttl
+
+    def _read_body(self, entry: CacheEntry) -> bytes:
+        with open(self._body_path(entry.key), "rb") as f:
+            data = f.read()
+        return zlib.decompress(data) if entry.compressed else data
+
+    async def read(self, entry: CacheEntry, revalidated: bool = False) -> Optional[bytes]:
+        """Load a cached body and count it as a hit (or revalidation); None if the file is gone"""
+        try:
+            body = await asyncio.to_thread(self._read_body, entry)
+        except (OSError, zlib.error):
+            self._delete(entry.key)
+            return None
+
+        now = time.time()
+        if revalidated:
+            # A 304 renews the entry for another ttl
+            self.db.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, entry.key))
+            self.revalidated += 1
+        else:
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, entry.key))
+            self.hits += 1
+        self.db.commit()
+        self.bytes_served += len(body)
+        return body
+
+    def _write_body(self, key: str, body: bytes) -> Tuple[bool, int]:
+        data = zlib.compress(body, 6)
+        compressed = len(data) < len(body)
+        if not compressed:
+            data = body
+
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return compressed, len(data)
+
+    async def store(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str],
+                    encoding: str = "utf-8"):
+        """Save a body downloaded in full (a miss) and evict old entries if the cache is over budget"""
+        self.open()
+        key = self.make_key(url)
+        compressed, size = await asyncio.to_thread(self._write_body, key, body)
+
+        previous = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if previous:
+            self.total_bytes -= previous[0]
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries (key, url, etag, last_modified, encoding, compressed, size, "
+            "stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, url, etag, last_modified, encoding, int(compressed), size, now, now),
+        )
+        self.total_bytes += size
+        self.misses += 1
+        self.evict()
+        self.db.commit()
+
+    def _delete(self, key: str):
+        row = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes"""
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for key, in self.db.execute("SELECT key FROM entries ORDER BY accessed_at").fetchall():
+            if self.total_bytes <= target:
+                break
+            self._delete(key)
+            self.evicted += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evicted": self.evicted,
+            "bytes_served_from_cache": self.bytes_served,
+            "cache_bytes": self.total_bytes,
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from aiohttp import ClientConnectionError, ClientPayloadError
+
+from AdaptiveLimiter import AdaptiveLimiter
+from Metrics import Metrics
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class FetchError(Exception):
+    """A URL could not be fetched; retryable errors are retried by RetryPolicy before this escapes"""
+
+    def __init__(self, url: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = status in RETRY_STATUSES
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Runs request attempts through an AdaptiveLimiter, retrying transient failures.
+
+    An attempt is an async callable doing one GET inside a limiter slot; it
+    raises FetchError for a non-200 status. Throttling, 5xx responses, timeouts
+    and dropped connections are retried with full jitter exponential backoff,
+    up to max_retries times. A server-given Retry-After is waited out in full
+    (pausing the whole limiter) and does not count as one of those retries;
+    max_retry_after optionally caps a single wait and max_retry_after_waits
+    bounds how many such waits one URL may take. Other errors escape at once.
+    Page fetches and image downloads share one policy.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter, max_retries: int = 4, backoff_base: float = 0.5,
+                 max_backoff: float = 30.0, max_retry_after: Optional[float] = None,
+                 max_retry_after_waits: int = 10, logger: Optional[logging.Logger] = None,
+                 metrics: Optional[Metrics] = None):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.max_retry_after_waits = max_retry_after_waits
+        self.logger = logger or logging.getLogger(__name__)
+        self.metrics = metrics or Metrics(enabled=False)
+        self.jitter = random.Random()
+
+    async def run(self, url: str, attempt: Callable[[], Awaitable[T]], request_class: str = "default") -> T:
+        """Call attempt() until it succeeds, fails for good or runs out of retries.
+
+        request_class picks the limiter's latency baseline (see AdaptiveLimiter).
+        """
+        retry = 0
+        waits = 0
+        while True:
+            try:
+                async with self.limiter.acquire():
+                    started = time.monotonic()
+                    result = await attempt()
+                    self.limiter.on_success(time.monotonic() - started, request_class)
+                    return result
+            except (FetchError, asyncio.TimeoutError, ClientConnectionError, ClientPayloadError) as e:
+                if isinstance(e, FetchError) and not e.retryable:
+                    raise
+                self.limiter.on_failure()
+
+                retry_after = e.retry_after if isinstance(e, FetchError) else None
+                if retry_after is not None and waits < self.max_retry_after_waits:
+                    # The server told us when to come back: hold every request, not just this one
+                    waits += 1
+                    delay = retry_after if self.max_retry_after is None else min(retry_after, self.max_retry_after)
+                    self.limiter.pause(delay)
+                else:
+                    if retry == self.max_retries:
+                        raise
+                    # Full jitter exponential backoff
+                    delay = self.jitter.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** retry))
+                    retry += 1
+                self.metrics.incr("fetch_retries")
+                self.logger.debug(f"Retrying {url} in {delay:.2f}s after {e!r} "
+                                  f"(retry {retry}, Retry-After wait {waits})")
+                await asyncio.sleep(delay)
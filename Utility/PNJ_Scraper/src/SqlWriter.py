@@ -0,0 +1,472 @@
+import glob
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+TABLES = ("categories", "products", "images", "features", "variants")
+
+
+def unique_path_prefix(path_prefix: str) -> str:
+    """path_prefix, or path_prefix_2, _3... if files with that prefix exist (names carry 1-second timestamps)"""
+    candidate = path_prefix
+    suffix = 1
+    while glob.glob(glob.escape(candidate) + "[._]*"):
+        suffix += 1
+        candidate = f"{path_prefix}_{suffix}"
+    return candidate
+
+
+class TableSpec:
+    """Target table of one record kind, its columns and the unique key used for upserts"""
+
+    def __init__(self, table: str, columns: Tuple[str, ...], key: Tuple[str, ...], updates: Tuple[str, ...]):
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self.updates = updates
+
+    def row_key(self, row: Dict) -> Tuple:
+        return tuple(row[column] for column in self.key)
+
+    def conflict_clause(self) -> str:
+        target = ", ".join(self.key)
+        if not self.updates:
+            return f"ON CONFLICT ({target}) DO NOTHING"
+        assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in self.updates)
+        return f"ON CONFLICT ({target}) DO UPDATE SET {assignments}"
+
+
+# Keys match the unique constraints created by SQL_CONSTRAINTS; updated columns match the DO-block UPDATEs
+TABLE_SPECS: Dict[str, TableSpec] = {
+    "categories": TableSpec("categories", ("id", "name", "url"), ("id",), ("name", "url")),
+    "products": TableSpec(
+        "products",
+        ("id", "name", "code", "description", "price", "status", "quantity", "category_id", "material",
+         "gold_karat", "color", "brand", "gender", "created_at", "updated_at"),
+        ("id",),
+        ("name", "price", "status", "quantity", "material", "gold_karat", "color", "brand", "gender",
+         "updated_at"),
+    ),
+    "images": TableSpec("product_images", ("product_id", "image_url", "is_primary", "sort_order"),
+                        ("product_id", "image_url"), ()),
+    "features": TableSpec("product_features", ("product_id", "name", "value"), ("product_id", "name"),
+                          ("value",)),
+    "variants": TableSpec("product_variants", ("product_id", "variant_type", "variant_value", "price", "quantity"),
+                          ("product_id", "variant_type", "variant_value"), ("price", "quantity")),
+}
+
+
+def escape_quotes(text: Any) -> str:
+    """Legacy escaping of the DO-block format: double single quotes, None becomes ''"""
+    if not text:
+        return ""
+    return str(text).replace("'", "''")
+
+
+def sql_literal(value: Any) -> str:
+    """Render a Python value as a PostgreSQL literal (standard_conforming_strings = on)"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        # NaN and infinities are only valid as quoted numeric literals
+        return repr(value) if math.isfinite(value) else f"'{value}'"
+    # PostgreSQL text cannot hold NUL bytes
+    return "'" + str(value).replace("\x00", "").replace("'", "''") + "'"
+
+
+def copy_field(value: Any) -> str:
+    """Render a Python value as a field of PostgreSQL COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (str(value).replace("\x00", "")
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r"))
+
+
+def dedupe_rows(spec: TableSpec, rows: List[Dict]) -> List[Dict]:
+    """Keep the last row per unique key; one upsert statement may not touch a row twice"""
+    return list({spec.row_key(row): row for row in rows}.values())
+
+
+SQL_CONSTRAINTS = (
+    "-- Add necessary constraints for ON CONFLICT clauses\n"
+    "DO $$ BEGIN\n"
+    "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'categories_id_key') THEN\n"
+    "        ALTER TABLE categories ADD CONSTRAINT categories_id_key UNIQUE (id);\n"
+    "    END IF;\n"
+    "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'products_id_key') THEN\n"
+    "        ALTER TABLE products ADD CONSTRAINT products_id_key UNIQUE (id);\n"
+    "    END IF;\n"
+    "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_images_product_id_image_url_key') THEN\n"
+    "        ALTER TABLE product_images ADD CONSTRAINT product_images_product_id_image_url_key UNIQUE (product_id, image_url);\n"
+    "    END IF;\n"
+    "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_features_product_id_name_key') THEN\n"
+    "        ALTER TABLE product_features ADD CONSTRAINT product_features_product_id_name_key UNIQUE (product_id, name);\n"
+    "    END IF;\n"
+    "    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'product_variants_product_id_variant_type_variant_value_key') THEN\n"
+    "        ALTER TABLE product_variants ADD CONSTRAINT product_variants_product_id_variant_type_variant_value_key UNIQUE (product_id, variant_type, variant_value);\n"
+    "    END IF;\n"
+    "EXCEPTION\n"
+    "    WHEN others THEN\n"
+    "    RAISE NOTICE 'Error adding constraints: %', SQLERRM;\n"
+    "END $$;\n\n"
+)
+
+
+def _escaped(row: Dict) -> Dict:
+    return {key: escape_quotes(value) if isinstance(value, str) else value for key, value in row.items()}
+
+
+class DoBlockRenderer:
+    """Renders rows as one IF NOT EXISTS ... INSERT/UPDATE DO block per row"""
+
+    name = "do-block"
+
+    def render_header(self) -> str:
+        return (
+            "-- PNJ Data Import Script\n"
+            f"-- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        )
+
+    def render_preamble(self) -> str:
+        """Statements every script runs once before the data"""
+        return SQL_CONSTRAINTS
+
+    def render_batch(self, batch: Dict[str, List[Dict]]) -> str:
+        """Render one batch of rows, tables in foreign-key order"""
+        parts = ["-- Categories Table\n"]
+
+        # Get unique categories by ID
+        unique_categories = {}
+        for cat in batch["categories"]:
+            unique_categories[cat["id"]] = _escaped(cat)
+
+        for cat in unique_categories.values():
+            parts.append(
+                f"DO $$ BEGIN\n"
+                f"    IF NOT EXISTS (SELECT 1 FROM categories WHERE id = {cat['id']}) THEN\n"
+                f"        INSERT INTO categories (id, name, url) VALUES ({cat['id']}, '{cat['name']}', '{cat['url']}');\n"
+                f"    ELSE\n"
+                f"        UPDATE categories SET name = '{cat['name']}', url = '{cat['url']}' WHERE id = {cat['id']};\n"
+                f"    END IF;\n"
+                f"END $$;\n"
+            )
+
+        parts.append("\n-- Products Table\n")
+        for product in map(_escaped, batch["products"]):
+            # Handle NULL values properly
+            gold_karat = "NULL" if product.get('gold_karat') is None else product['gold_karat']
+            parts.append(
+                f"DO $$ BEGIN\n"
+                f"    IF NOT EXISTS (SELECT 1 FROM products WHERE id = {product['id']}) THEN\n"
+                f"        INSERT INTO products (id, name, code, description, price, status, quantity, category_id, material, gold_karat, color, brand, gender, created_at, updated_at) VALUES \n"
+                f"        ({product['id']}, '{product['name']}', '{product['code']}', '{product['description']}', {product['price']}, '{product['status']}', {product['quantity']}, {product['category_id']}, '{product['material']}', {gold_karat}, '{product['color']}', '{product['brand']}', {product['gender']}, '{product['created_at']}', '{product['updated_at']}');\n"
+                f"    ELSE\n"
+                f"        UPDATE products SET name = '{product['name']}', price = {product['price']}, status = '{product['status']}', quantity = {product['quantity']}, material = '{product['material']}', gold_karat = {gold_karat}, color = '{product['color']}', brand = '{product['brand']}', gender = {product['gender']}, updated_at = '{product['updated_at']}' WHERE id = {product['id']};\n"
+                f"    END IF;\n"
+                f"END $$;\n"
+            )
+
+        parts.append("\n-- Product Images Table\n")
+        for img in map(_escaped, batch["images"]):
+            parts.append(
+                f"DO $$ BEGIN\n"
+                f"    IF NOT EXISTS (SELECT 1 FROM product_images WHERE product_id = {img['product_id']} AND image_url = '{img['image_url']}') THEN\n"
+                f"        INSERT INTO product_images (product_id, image_url, is_primary, sort_order) VALUES \n"
+                f"        ({img['product_id']}, '{img['image_url']}', {str(img['is_primary']).lower()}, {img['sort_order']});\n"
+                f"    END IF;\n"
+                f"END $$;\n"
+            )
+
+        parts.append("\n-- Product Features Table\n")
+        for feature in map(_escaped, batch["features"]):
+            parts.append(
+                f"DO $$ BEGIN\n"
+                f"    IF NOT EXISTS (SELECT 1 FROM product_features WHERE product_id = {feature['product_id']} AND name = '{feature['name']}') THEN\n"
+                f"        INSERT INTO product_features (product_id, name, value) VALUES \n"
+                f"        ({feature['product_id']}, '{feature['name']}', '{feature['value']}');\n"
+                f"    ELSE\n"
+                f"        UPDATE product_features SET value = '{feature['value']}' WHERE product_id = {feature['product_id']} AND name = '{feature['name']}';\n"
+                f"    END IF;\n"
+                f"END $$;\n"
+            )
+
+        parts.append("\n-- Product Variants Table\n")
+        for variant in map(_escaped, batch["variants"]):
+            parts.append(
+                f"DO $$ BEGIN\n"
+                f"    IF NOT EXISTS (SELECT 1 FROM product_variants WHERE product_id = {variant['product_id']} AND variant_type = '{variant['variant_type']}' AND variant_value = '{variant['variant_value']}') THEN\n"
+                f"        INSERT INTO product_variants (product_id, variant_type, variant_value, price, quantity) VALUES \n"
+                f"        ({variant['product_id']}, '{variant['variant_type']}', '{variant['variant_value']}', {variant['price']}, {variant['quantity']});\n"
+                f"    ELSE\n"
+                f"        UPDATE product_variants SET price = {variant['price']}, quantity = {variant['quantity']} WHERE product_id = {variant['product_id']} AND variant_type = '{variant['variant_type']}' AND variant_value = '{variant['variant_value']}';\n"
+                f"    END IF;\n"
+                f"END $$;\n"
+            )
+
+        return "".join(parts)
+
+    def render_script(self, batch: Dict[str, List[Dict]]) -> str:
+        """Render a complete single-transaction script"""
+        return (
+            self.render_header()
+            + "BEGIN;\n\n"
+            + self.render_preamble()
+            + self.render_batch(batch)
+            + "\nCOMMIT;\n"
+        )
+
+
+class UpsertRenderer(DoBlockRenderer):
+    """Renders rows as batched multi-row INSERT ... ON CONFLICT DO UPDATE statements"""
+
+    name = "upsert"
+
+    def __init__(self, statement_rows: int = 500):
+        self.statement_rows = statement_rows
+
+    def render_preamble(self) -> str:
+        return "SET standard_conforming_strings = on;\n\n" + SQL_CONSTRAINTS
+
+    def render_batch(self, batch: Dict[str, List[Dict]]) -> str:
+        parts = []
+        for table in TABLES:
+            spec = TABLE_SPECS[table]
+            rows = dedupe_rows(spec, batch[table])
+            for start in range(0, len(rows), self.statement_rows):
+                values = ",\n".join(
+                    "    (" + ", ".join(sql_literal(row[column]) for column in spec.columns) + ")"
+                    for row in rows[start:start + self.statement_rows]
+                )
+                parts.append(
+                    f"INSERT INTO {spec.table} ({', '.join(spec.columns)}) VALUES\n"
+                    f"{values}\n"
+                    f"{spec.conflict_clause()};\n"
+                )
+        return "".join(parts)
+
+
+class SqlScriptWriter:
+    """Streams extracted rows to SQL files as they are produced.
+
+    Rows are buffered and written in chunks, each wrapped in its own
+    transaction, so an interrupted crawl still leaves a valid script holding
+    every chunk committed so far. Output rolls over to a new part file once
+    max_file_bytes or max_file_rows is reached.
+    """
+
+    def __init__(self, path_prefix: str, renderer: Optional[DoBlockRenderer] = None,
+                 chunk_rows: int = 500, max_file_bytes: int = 0, max_file_rows: int = 0):
+        self.path_prefix = unique_path_prefix(path_prefix)
+        self.renderer = renderer or DoBlockRenderer()
+        self.chunk_rows = chunk_rows
+        self.max_file_bytes = max_file_bytes
+        self.max_file_rows = max_file_rows
+
+        self.buffer: Dict[str, List[Dict]] = {table: [] for table in TABLES}
+        self.buffered_rows = 0
+        self.seen_category_ids = set()
+        self.row_counts: Dict[str, int] = {table: 0 for table in TABLES}
+
+        self.file = None
+        self.part = 0
+        self.file_bytes = 0
+        self.file_rows = 0
+        self.paths: List[str] = []
+        self.closed = False
+        # flush() runs in a worker thread; close() waits for it rather than writing the same buffer and file
+        self.lock = threading.RLock()
+
+    def __enter__(self) -> "SqlScriptWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def rolling(self) -> bool:
+        return bool(self.max_file_bytes or self.max_file_rows)
+
+    def _open_next_file(self):
+        if self.file is not None:
+            self.file.close()
+        self.part += 1
+        path = f"{self.path_prefix}_part{self.part:03d}.sql" if self.rolling else f"{self.path_prefix}.sql"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "x", encoding="utf-8")
+        self.paths.append(path)
+        self.file_bytes = 0
+        self.file_rows = 0
+        self._write(self.renderer.render_header() + "BEGIN;\n\n" + self.renderer.render_preamble() + "COMMIT;\n\n")
+
+    def _write(self, text: str):
+        self.file.write(text)
+        self.file.flush()
+        self.file_bytes += len(text.encode("utf-8"))
+
+    def _needs_roll(self) -> bool:
+        return ((self.max_file_bytes and self.file_bytes >= self.max_file_bytes)
+                or (self.max_file_rows and self.file_rows >= self.max_file_rows))
+
+    def add(self, records: Dict[str, List[Dict]]) -> bool:
+        """Buffer one product's rows; returns True when a chunk is ready to flush"""
+        for table in TABLES:
+            rows = records.get(table, ())
+            if table == "categories":
+                rows = [cat for cat in rows if cat["id"] not in self.seen_category_ids]
+                self.seen_category_ids.update(cat["id"] for cat in rows)
+            self.buffer[table].extend(rows)
+            self.buffered_rows += len(rows)
+        return self.buffered_rows >= self.chunk_rows
+
+    def flush(self):
+        """Write buffered rows as one committed transaction"""
+        with self.lock:
+            if not self.buffered_rows or self.closed:
+                return
+            if self.file is None or self._needs_roll():
+                self._open_next_file()
+
+            self._write("BEGIN;\n\n" + self.renderer.render_batch(self.buffer) + "\nCOMMIT;\n\n")
+            for table in TABLES:
+                self.row_counts[table] += len(self.buffer[table])
+                self.buffer[table] = []
+            self.file_rows += self.buffered_rows
+            self.buffered_rows = 0
+
+    def close(self):
+        """Flush what is left and close the current file (after a flush still running in another thread)"""
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            if self.file is None:
+                # Nothing was extracted: still leave a valid (empty) script behind
+                self._open_next_file()
+            self.file.close()
+            self.file = None
+            self.closed = True
+
+
+class CopyWriter:
+    """Streams rows to PostgreSQL COPY text files plus a staging-table merge script.
+
+    Each table gets a <prefix>_<table>.copy data file that grows chunk by
+    chunk. <prefix>_load.sql is written up front: run it with psql, which
+    \\copy-loads the data files into temporary staging tables and merges them
+    into the real tables with one INSERT ... ON CONFLICT per table.
+    """
+
+    def __init__(self, path_prefix: str, chunk_rows: int = 500):
+        path_prefix = unique_path_prefix(path_prefix)
+        self.path_prefix = path_prefix
+        self.chunk_rows = chunk_rows
+
+        self.buffer: Dict[str, List[Dict]] = {table: [] for table in TABLES}
+        self.buffered_rows = 0
+        self.seen_category_ids = set()
+        self.row_counts: Dict[str, int] = {table: 0 for table in TABLES}
+
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+        self.data_paths = {table: os.path.abspath(f"{path_prefix}_{table}.copy") for table in TABLES}
+        self.files = {table: open(path, "x", encoding="utf-8") for table, path in self.data_paths.items()}
+        self.script_path = f"{path_prefix}_load.sql"
+        self.paths: List[str] = [self.script_path] + list(self.data_paths.values())
+        with open(self.script_path, "x", encoding="utf-8") as f:
+            f.write(self.render_load_script())
+        self.closed = False
+        # flush() runs in a worker thread; close() waits for it rather than writing the same buffer and files
+        self.lock = threading.RLock()
+
+    def __enter__(self) -> "CopyWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def render_load_script(self) -> str:
+        parts = [
+            "-- PNJ Data Import Script (COPY + staging merge, run with psql)\n",
+            f"-- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+            "SET standard_conforming_strings = on;\n\n",
+            "BEGIN;\n\n",
+            SQL_CONSTRAINTS,
+        ]
+        for table in TABLES:
+            spec = TABLE_SPECS[table]
+            columns = ", ".join(spec.columns)
+            stage = f"stage_{spec.table}"
+            data_path = self.data_paths[table].replace("'", "''")
+            parts.append(
+                f"-- {spec.table}\n"
+                f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {columns} FROM {spec.table} WITH NO DATA;\n"
+                f"\\copy {stage} ({columns}) FROM '{data_path}'\n"
+                f"INSERT INTO {spec.table} ({columns})\n"
+                f"    SELECT DISTINCT ON ({', '.join(spec.key)}) {columns} FROM {stage} ORDER BY {', '.join(spec.key)}\n"
+                f"{spec.conflict_clause()};\n\n"
+            )
+        parts.append("COMMIT;\n")
+        return "".join(parts)
+
+    def add(self, records: Dict[str, List[Dict]]) -> bool:
+        """Buffer one product's rows; returns True when a chunk is ready to flush"""
+        for table in TABLES:
+            rows = records.get(table, ())
+            if table == "categories":
+                rows = [cat for cat in rows if cat["id"] not in self.seen_category_ids]
+                self.seen_category_ids.update(cat["id"] for cat in rows)
+            self.buffer[table].extend(rows)
+            self.buffered_rows += len(rows)
+        return self.buffered_rows >= self.chunk_rows
+
+    def flush(self):
+        """Append buffered rows to the data files as whole lines"""
+        with self.lock:
+            if not self.buffered_rows or self.closed:
+                return
+            for table in TABLES:
+                rows = self.buffer[table]
+                if not rows:
+                    continue
+                columns = TABLE_SPECS[table].columns
+                self.files[table].write("".join(
+                    "\t".join(copy_field(row[column]) for column in columns) + "\n" for row in rows
+                ))
+                self.files[table].flush()
+                self.row_counts[table] += len(rows)
+                self.buffer[table] = []
+            self.buffered_rows = 0
+
+    def close(self):
+        """Flush what is left and close the data files (after a flush still running in another thread)"""
+        with self.lock:
+            if self.closed:
+                return
+            self.flush()
+            for f in self.files.values():
+                f.close()
+            self.closed = True
+
+
+def create_sql_writer(output_format: str, path_prefix: str, chunk_rows: int = 500,
+                      max_file_bytes: int = 0, max_file_rows: int = 0) -> Union[SqlScriptWriter, CopyWriter]:
+    """Build the writer for an output format: 'do-block', 'upsert' or 'copy'"""
+    if output_format == "copy":
+        return CopyWriter(path_prefix, chunk_rows=chunk_rows)
+    if output_format == "upsert":
+        renderer = UpsertRenderer()
+    elif output_format == "do-block":
+        renderer = DoBlockRenderer()
+    else:
+        raise ValueError(f"Unknown SQL output format {output_format!r}, expected 'do-block', 'upsert' or 'copy'")
+    return SqlScriptWriter(path_prefix, renderer, chunk_rows, max_file_bytes, max_file_rows)
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PAGE = "page"
+PRODUCT = "product"
+
+
+class WorkQueue:
+    """Shared SQLite work queue of listing pages and product URLs, with leases.
+
+    Any number of worker processes open the same database file. lease() hands
+    out pending items, and items whose lease has expired, so the work of a
+    dead worker is picked up again once its leases run out; live workers keep
+    theirs with renew(). Product ids are claimed with claim_product() so a
+    product listed under several URLs is written by one worker only.
+
+    Finished items are staged in memory and written by commit(), which the
+    worker runs right after the output covering them has been flushed (as with
+    CrawlState): a crash re-queues work, it never loses it. All writes are
+    short transactions, so workers never block each other for long.
+    SQLite needs a local disk (or one that honours file locks) shared by all
+    the workers. Methods may be called from worker threads (asyncio.to_thread)
+    so lock waits never stall an event loop; one lock serializes them.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 120.0, max_attempts: int = 5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.db: Optional[sqlite3.Connection] = None
+        self.lock = threading.RLock()
+        self.staged_items: List[int] = []
+        self.staged_claims: List[str] = []
+
+    def open(self):
+        with self.lock:
+            if self.db is None:
+                self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "    id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, value TEXT NOT NULL,"
+            "    status TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_until REAL,"
+            "    attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL NOT NULL,"
+            "    UNIQUE (kind, value));"
+            "CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_until);"
+            "CREATE TABLE IF NOT EXISTS claims ("
+            "    product_id TEXT PRIMARY KEY, worker TEXT NOT NULL, claim_until REAL NOT NULL,"
+            "    committed INTEGER NOT NULL DEFAULT 0);"
+        )
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    @contextmanager
+    def transaction(self):
+        """Take the write lock up front so concurrent workers queue up instead of failing to upgrade"""
+        with self.lock:
+            self.open()
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def enqueue(self, kind: str, values: Iterable[str]) -> int:
+        """Add items that are not queued yet; returns how many were new"""
+        now = time.time()
+        with self.transaction():
+            cursor = self.db.executemany(
+                "INSERT OR IGNORE INTO items (kind, value, updated_at) VALUES (?, ?, ?)",
+                ((kind, value, now) for value in values),
+            )
+        return cursor.rowcount
+
+    def lease(self, worker: str, limit: int) -> List[Tuple[int, str, str]]:
+        """Lease up to limit pending or expired items as (id, kind, value), products before pages"""
+        now = time.time()
+        with self.transaction():
+            # Items that keep failing (or keep killing their worker) are parked instead of retried forever
+            self.db.execute(
+                "UPDATE items SET status = 'failed', error = 'lease expired too often', updated_at = ? "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = self.db.execute(
+                "SELECT id, kind, value FROM items "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+                "ORDER BY kind = 'page', id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE items SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                ((worker, now + self.lease_seconds, now, row[0]) for row in rows),
+            )
+        return rows
+
+    def renew(self, worker: str):
+        """Extend every lease and uncommitted product claim held by a worker"""
+        until = time.time() + self.lease_seconds
+        with self.transaction():
+            self.db.execute("UPDATE items SET lease_until = ? WHERE worker = ? AND status = 'leased'",
+                            (until, worker))
+            self.db.execute("UPDATE claims SET claim_until = ? WHERE worker = ? AND committed = 0", (until, worker))
+
+    def claim_product(self, product_id, worker: str) -> bool:
+        """Claim a product id for this worker; False if another worker holds or has written it"""
+        now = time.time()
+        with self.transaction():
+            cursor = self.db.execute(
+                "INSERT INTO claims (product_id, worker, claim_until) VALUES (?, ?, ?) "
+                "ON CONFLICT (product_id) DO UPDATE SET worker = excluded.worker, claim_until = excluded.claim_until "
+                "WHERE claims.committed = 0 AND (claims.claim_until < ? OR claims.worker = excluded.worker)",
+                (str(product_id), worker, now + self.lease_seconds, now),
+            )
+        return cursor.rowcount == 1
+
+    def ack(self, item_id: int):
+        """Mark an item done right away (listing pages, once their products are queued)"""
+        with self.transaction():
+            self.db.execute("UPDATE items SET status = 'done', updated_at = ? WHERE id = ?", (time.time(), item_id))
+
+    def stage_done(self, item_id: int, product_id=None):
+        """Mark an item (and the product it produced) done at the next commit()"""
+        self.staged_items.append(item_id)
+        if product_id is not None:
+            self.staged_claims.append(str(product_id))
+
+    def commit(self) -> int:
+        """Write the staged acknowledgements; returns how many items they covered"""
+        # Swapped out first: stage_done() may keep appending from the event loop while this runs in a thread
+        items, claims = self.staged_items, self.staged_claims
+        self.staged_items, self.staged_claims = [], []
+        if not items and not claims:
+            return 0
+        now = time.time()
+        try:
+            with self.transaction():
+                self.db.executemany("UPDATE items SET status = 'done', updated_at = ? WHERE id = ?",
+                                    ((now, item_id) for item_id in items))
+                self.db.executemany("UPDATE claims SET committed = 1 WHERE product_id = ?",
+                                    ((product_id,) for product_id in claims))
+        except BaseException:
+            self.staged_items[:0] = items
+            self.staged_claims[:0] = claims
+            raise
+        return len(items)
+
+    def release(self, item_id: int, error: str):
+        """Give a leased item back to the queue for another try, or fail it once out of attempts"""
+        with self.transaction():
+            self.db.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, error = ?, updated_at = ? WHERE id = ?",
+                (self.max_attempts, error, time.time(), item_id),
+            )
+
+    def fail(self, item_id: int, error: str):
+        """Take an item out of the queue for good (failed after the fetch retries)"""
+        with self.transaction():
+            self.db.execute("UPDATE items SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                            (error, time.time(), item_id))
+
+    def unfinished_count(self) -> int:
+        """Items still pending or leased, by any worker"""
+        with self.lock:
+            self.open()
+            return self.db.execute("SELECT COUNT(*) FROM items WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def failed_items(self) -> List[Tuple[str, str, Optional[str]]]:
+        with self.lock:
+            self.open()
+            return self.db.execute(
+                "SELECT kind, value, error FROM items WHERE status = 'failed' ORDER BY id"
+            ).fetchall()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            self.open()
+            stats = {f"{kind}_{status}": count for kind, status, count in self.db.execute(
+                "SELECT kind, status, COUNT(*) FROM items GROUP BY kind, status"
+            )}
+            stats["claimed_products"] = self.db.execute(
+                "SELECT COUNT(*) FROM claims WHERE committed = 1"
+            ).fetchone()[0]
+        return stats